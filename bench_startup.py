@@ -0,0 +1,75 @@
+"""
+Startup benchmark
+Measures what each main.py subcommand pays at import time using
+`python -X importtime`, without running the stage itself.
+
+Usage: python bench_startup.py [stage ...] [--top N]
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+
+from main import STAGE_MODULES
+
+
+def parse_importtime(stderr: str):
+    """Return [(cumulative_us, module)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        try:
+            rows.append((int(cumulative), module.rstrip()))
+        except ValueError:
+            continue  # header row
+    return rows
+
+
+def bench(code: str):
+    """Run `code` in a fresh interpreter under -X importtime."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1]
+        return elapsed, [], last_line
+    return elapsed, parse_importtime(result.stderr), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("stages", nargs="*", default=["baseline", *STAGE_MODULES])
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    for stage in args.stages:
+        if stage == "baseline":
+            # Just main.py itself
+            code = "import main"
+        elif stage in STAGE_MODULES:
+            code = f"import main; main.load_stage({stage!r})"
+        else:
+            print(f"Unknown stage '{stage}'")
+            continue
+
+        elapsed, rows, error = bench(code)
+        print(f"\n⏱️  {stage}: {elapsed * 1000:.0f} ms wall")
+        if error:
+            print(f"   failed: {error}")
+            continue
+        # Indentation in the module column marks nesting; top-level rows add up
+        top_level = [(us, m.strip()) for us, m in rows if not m.startswith("  ")]
+        print(f"   imports: {sum(us for us, _ in top_level) / 1000:.0f} ms")
+        for us, module in sorted(top_level, reverse=True)[: args.top]:
+            print(f"   {us / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
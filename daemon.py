@@ -0,0 +1,296 @@
+"""
+Pass The Gavel daemon
+Long-running alternative to main.py that keeps the Whisper model, HTTP
+sessions and the Discord connection warm between episodes. Episodes run
+on a cron-like schedule and/or when a voice message arrives, and a
+health/metrics snapshot is served over HTTP.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import aiohttp
+from aiohttp import web
+
+from config import config
+from discord.discord_filtered_read import get_discord_client, process_discord_messages
+from discord.discord_write_attachment import PODCAST_MESSAGE, send_podcast_file
+from transcript.create_snippets import AudioSnippetExtractor
+from transcript.generate_transcript import generate_script
+from podcast.generate_podcast import SimplePodcastGenerator, generate_podcast_from_data
+
+# Standard 5-field cron expression: minute hour day-of-month month day-of-week,
+# or "off" for no scheduled episodes
+DAEMON_SCHEDULE = os.getenv("DAEMON_SCHEDULE") or "0 18 * * 0"
+# Start an episode this many seconds after the last voice message (0 = off)
+DAEMON_MESSAGE_DEBOUNCE = int(os.getenv("DAEMON_MESSAGE_DEBOUNCE") or 0)
+DAEMON_LOOKBACK_HOURS = int(os.getenv("DAEMON_LOOKBACK_HOURS") or 24)
+DAEMON_HEALTH_PORT = int(os.getenv("DAEMON_HEALTH_PORT") or 8080)
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-"))
+        else:
+            start = end = int(part)
+        if start < low or end > high:
+            raise ValueError(f"Cron value {part} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Minimal cron matcher (minute hour day month weekday, Sunday = 0)."""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got '{expression}'")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        # Accept 7 as Sunday too, like most crons
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.day in self.days
+            and moment.month in self.months
+            and (moment.weekday() + 1) % 7 in self.weekdays
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # A year of minutes covers every valid expression
+        for _ in range(366 * 24 * 60):
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+
+class PodcastDaemon:
+    def __init__(self):
+        self.client = get_discord_client()
+        self.schedule = (
+            None
+            if DAEMON_SCHEDULE.strip().lower() == "off"
+            else CronSchedule(DAEMON_SCHEDULE)
+        )
+        self.extractor = AudioSnippetExtractor(os.getenv("OPENROUTER_API_KEY"))
+        self.generator = SimplePodcastGenerator(
+            os.getenv("ELEVENLABS_API_KEY"), pause_duration=200
+        )
+        self.session = None
+        self.episode_lock = asyncio.Lock()
+        # The debounce countdown; the episode it starts is a separate task,
+        # so restarting the countdown never cancels a running episode
+        self.pending_trigger = None
+        self.episode_task = None
+        self.started = False
+
+        # Whisper and the OpenRouter client live on one worker loop/thread, so
+        # CPU-bound transcription never blocks the Discord heartbeat and the
+        # async HTTP pool is never shared across event loops.
+        self.worker_loop = asyncio.new_event_loop()
+        self.worker_thread = threading.Thread(
+            target=self.worker_loop.run_forever, name="ptg-worker", daemon=True
+        )
+
+        self.metrics = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "episodes_started": 0,
+            "episodes_succeeded": 0,
+            "episodes_failed": 0,
+            "running": False,
+            "last_trigger": None,
+            "last_started_at": None,
+            "last_finished_at": None,
+            "last_error": None,
+            "last_stage_seconds": {},
+            "next_scheduled_at": None,
+        }
+
+        self.client.event(self.on_ready)
+        self.client.event(self.on_message)
+
+    async def _run_on_worker(self, coro):
+        async def guarded():
+            try:
+                return await coro
+            except SystemExit as e:
+                # The pipeline stages sys.exit() on fatal errors; keep the daemon up
+                raise RuntimeError(f"stage exited with status {e.code}") from None
+
+        future = asyncio.run_coroutine_threadsafe(guarded(), self.worker_loop)
+        return await asyncio.wrap_future(future)
+
+    def _warm_up(self):
+        print("Warming up Whisper model...")
+        # Touching the property loads the weights on the worker thread
+        self.extractor.whisper_model
+
+    async def run_episode(self, trigger: str):
+        if self.episode_lock.locked():
+            print(f"Episode already running, ignoring {trigger} trigger")
+            return
+
+        async with self.episode_lock:
+            self.metrics.update(
+                running=True,
+                last_trigger=trigger,
+                last_started_at=datetime.now().isoformat(timespec="seconds"),
+                last_stage_seconds={},
+            )
+            self.metrics["episodes_started"] += 1
+            print(f"🎙️  Starting episode ({trigger})")
+
+            async def stage(name, coro):
+                started = time.perf_counter()
+                result = await coro
+                elapsed = round(time.perf_counter() - started, 2)
+                self.metrics["last_stage_seconds"][name] = elapsed
+                return result
+
+            try:
+                lookback = timedelta(hours=DAEMON_LOOKBACK_HOURS)
+                ingested = await stage(
+                    "ingest",
+                    process_discord_messages(self.client, self.session, lookback),
+                )
+                if not ingested:
+                    raise RuntimeError("Failed to get messages")
+                await stage(
+                    "script", self._run_on_worker(generate_script(self.extractor))
+                )
+                channel = self.client.get_channel(config.SEND_CHANNEL_ID)
+                if not channel:
+                    raise RuntimeError(
+                        f"Could not find channel with ID {config.SEND_CHANNEL_ID}"
+                    )
+                # Encoded for this server's upload limit as part of the render
+                podcast_files = await stage(
+                    "render",
+                    asyncio.to_thread(
+                        generate_podcast_from_data,
+                        self.generator,
+                        size_limit=channel.guild.filesize_limit,
+                    ),
+                )
+                if not podcast_files:
+                    raise RuntimeError("Failed to render podcast")
+                sent = await stage(
+                    "publish",
+                    send_podcast_file(channel, PODCAST_MESSAGE, podcast_files),
+                )
+                if not sent:
+                    raise RuntimeError("Failed to publish podcast")
+                self.metrics["episodes_succeeded"] += 1
+                self.metrics["last_error"] = None
+                print("✅ Episode published")
+            except Exception as e:
+                self.metrics["episodes_failed"] += 1
+                self.metrics["last_error"] = str(e)
+                print(f"❌ Episode failed: {e}")
+            finally:
+                self.metrics["running"] = False
+                self.metrics["last_finished_at"] = datetime.now().isoformat(
+                    timespec="seconds"
+                )
+
+    async def schedule_loop(self):
+        while True:
+            next_run = self.schedule.next_after(datetime.now())
+            self.metrics["next_scheduled_at"] = next_run.isoformat()
+            print(f"⏰ Next scheduled episode at {next_run}")
+            await asyncio.sleep((next_run - datetime.now()).total_seconds())
+            await self.run_episode("schedule")
+
+    async def _debounced_episode(self):
+        await asyncio.sleep(DAEMON_MESSAGE_DEBOUNCE)
+        # Messages that arrived during an episode queue one more after it
+        async with self.episode_lock:
+            pass
+        self.episode_task = asyncio.create_task(self.run_episode("message"))
+
+    async def on_message(self, message):
+        if not DAEMON_MESSAGE_DEBOUNCE or message.author.bot:
+            return
+        if message.channel.id != config.UPLOAD_CHANNEL_ID:
+            return
+        if not any(
+            a.content_type and "audio" in a.content_type for a in message.attachments
+        ):
+            return
+
+        # Restart the countdown so a burst of voice notes makes one episode
+        if self.pending_trigger and not self.pending_trigger.done():
+            self.pending_trigger.cancel()
+        self.pending_trigger = asyncio.create_task(self._debounced_episode())
+
+    def health_snapshot(self) -> dict:
+        return {
+            **self.metrics,
+            "discord_ready": self.client.is_ready(),
+            "whisper_loaded": self.extractor._whisper_model is not None,
+            "schedule": self.schedule.expression if self.schedule else None,
+        }
+
+    async def handle_health(self, request):
+        return web.json_response(self.health_snapshot())
+
+    async def start_health_server(self):
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, port=DAEMON_HEALTH_PORT).start()
+        print(f"🩺 Health endpoint on http://0.0.0.0:{DAEMON_HEALTH_PORT}/health")
+
+    async def on_ready(self):
+        print(f"Logged in as {self.client.user} (ID: {self.client.user.id})")
+        # on_ready fires again after reconnects; only start things once
+        if self.started:
+            return
+        self.started = True
+
+        self.session = aiohttp.ClientSession()
+        await self.start_health_server()
+        self.worker_loop.call_soon_threadsafe(self._warm_up)
+        if self.schedule:
+            asyncio.create_task(self.schedule_loop())
+
+    def run(self):
+        if not self.schedule and not DAEMON_MESSAGE_DEBOUNCE:
+            print(
+                "⚠️  DAEMON_SCHEDULE is off and DAEMON_MESSAGE_DEBOUNCE is 0; "
+                "no episode will ever start"
+            )
+        self.worker_thread.start()
+        try:
+            self.client.run(config.DISCORD_TOKEN)
+        finally:
+            self.worker_loop.call_soon_threadsafe(self.worker_loop.stop)
+
+
+def main():
+    PodcastDaemon().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,24 @@ import discord
 import aiohttp
 import os
 import json
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
 from config import config
+from tenants import default_tenant
+from podcast.export import save_upload_limit
+from transcript.audio_index import AudioIndex
 
+HISTORY_PAGE_SIZE = 100  # Discord's maximum per request
+DOWNLOAD_CONCURRENCY = int(os.getenv("DISCORD_DOWNLOAD_CONCURRENCY") or 4)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+SCAN_CHECKPOINT = "scan_checkpoint.json"
+# A crashed scan is resumed only if it was asking for (nearly) the same window
+SCAN_CHECKPOINT_MAX_AGE = timedelta(hours=1)
+AUDIO_INDEX = "audio_index.json"
 
-def create_folders():
-    data_folder = config.DOWNLOAD_FOLDER
+
+def create_folders(data_folder=None):
+    data_folder = data_folder or config.DOWNLOAD_FOLDER
     voice_folder = os.path.join(data_folder, "voice_messages")
     voice_metadata_file = os.path.join(data_folder, "ptg_discord_data.json")
     if not os.path.exists(data_folder):
@@ -24,30 +36,223 @@ def get_discord_client():
     return discord.Client(intents=intents)
 
 
-async def download_voice_attachment(
-    author_name, attachment, session, download_folder, index
-):
-    unique_filename = f"{attachment.id}_{author_name}_{attachment.filename}"
+async def download_voice_attachment(author_name, attachment, session, download_folder):
+    """Stream one attachment (a raw API dict) to disk; returns its filename."""
+    unique_filename = f"{attachment['id']}_{author_name}_{attachment['filename']}"
     file_path = os.path.join(download_folder, unique_filename)
+    if os.path.exists(file_path):
+        # Already fetched by a scan that was interrupted before finishing
+        return unique_filename
+    tmp_path = f"{file_path}.part"
     try:
-        async with session.get(attachment.url) as resp:
+        async with session.get(attachment["url"]) as resp:
             if resp.status == 200:
-                with open(file_path, "wb") as f:
-                    f.write(await resp.read())
+                with open(tmp_path, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(tmp_path, file_path)
                 return unique_filename
             else:
-                print(f"Failed to download {attachment.filename}: status {resp.status}")
+                print(
+                    f"Failed to download {attachment['filename']}: status {resp.status}"
+                )
     except Exception as e:
-        print(f"Error downloading {attachment.filename}: {e}")
+        print(f"Error downloading {attachment['filename']}: {e}")
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
     return None
 
 
-async def fetch_recent_messages(channel, time_delta):
-    cutoff_time = datetime.utcnow() - time_delta
-    recent_messages = []
-    async for message in channel.history(limit=None, after=cutoff_time):
-        recent_messages.append(message)
-    return recent_messages
+class ScanCheckpoint:
+    """
+    Where an in-progress history scan got to: the last message id whose
+    attachments are all on disk, plus the speaker map built so far. A scan
+    that crashes resumes from here instead of starting over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, channel_id: int, cutoff: datetime, time_delta: timedelta):
+        """
+        The saved state, if it belongs to a scan of this channel over the
+        same window starting within SCAN_CHECKPOINT_MAX_AGE of `cutoff`.
+        Anything else is left over from an unrelated scan and is discarded.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            matches = (
+                state["channel_id"] == channel_id
+                and state["window_seconds"] == time_delta.total_seconds()
+                and abs(state["cutoff"] - cutoff.timestamp())
+                <= SCAN_CHECKPOINT_MAX_AGE.total_seconds()
+            )
+        except (KeyError, TypeError):
+            matches = False
+        if not matches:
+            print("🗑️  Discarding a stale history scan checkpoint")
+            self.clear()
+            return None
+        return state
+
+    def save(self, state: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def history_pages(client, channel_id: int, after: int):
+    """
+    Yield the channel's messages after `after` one API page at a time,
+    oldest page first, as raw dicts (no discord.Message objects).
+    """
+    while True:
+        page = await client.http.logs_from(channel_id, HISTORY_PAGE_SIZE, after=after)
+        if not page:
+            return
+        page.sort(key=lambda m: int(m["id"]))
+        yield page
+        if len(page) < HISTORY_PAGE_SIZE:
+            return
+        after = int(page[-1]["id"])
+
+
+def voice_attachments(page, tenant):
+    """(author name, attachment) for every audio attachment from a human."""
+    for message in page:
+        author = message.get("author", {})
+        if author.get("bot"):
+            continue
+        for attachment in message.get("attachments", ()):
+            content_type = attachment.get("content_type") or ""
+            if "audio" in content_type:
+                # Per-tenant username map, with the tenant's fallback name
+                yield tenant.display_name(author.get("username", "")), attachment
+
+
+async def scan_voice_messages(client, session, tenant, voice_folder, time_delta):
+    """
+    Stream the upload channel's history into the download pool: each page
+    is filtered down to its voice attachments, which start downloading
+    while the next page is fetched. At most two pages are held at once,
+    and the checkpoint advances once a page's downloads have all finished.
+    Downloads whose content is already on disk (a reposted voice note) are
+    replaced by the existing file. Returns {speaker name: [filenames]} in message order.
+    """
+    channel_id = tenant.upload_channel_id
+    checkpoint = ScanCheckpoint(
+        os.path.join(os.path.dirname(voice_folder), SCAN_CHECKPOINT)
+    )
+    cutoff = datetime.now(timezone.utc) - time_delta
+    state = checkpoint.load(channel_id, cutoff, time_delta)
+    if state is not None:
+        print(f"↩️  Resuming history scan after message {state['after']}")
+    else:
+        state = {
+            "channel_id": channel_id,
+            "cutoff": cutoff.timestamp(),
+            "window_seconds": time_delta.total_seconds(),
+            "after": discord.utils.time_snowflake(cutoff),
+            "user_audio_map": {},
+        }
+
+    index = AudioIndex(os.path.join(os.path.dirname(voice_folder), AUDIO_INDEX))
+    semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+    async def download(author_name, attachment):
+        async with semaphore:
+            print(f"Voice message: {attachment['filename']} from {author_name}")
+            filename = await download_voice_attachment(
+                author_name, attachment, session, voice_folder
+            )
+            return author_name, filename
+
+    async def commit(cursor, tasks):
+        for author_name, filename in await asyncio.gather(*tasks):
+            if not filename:
+                continue
+            path = os.path.join(voice_folder, filename)
+            canonical = await asyncio.to_thread(index.canonical, path)
+            if canonical != path:
+                print(f"♻️  {filename} repeats {os.path.basename(canonical)}")
+                os.remove(path)
+                filename = os.path.basename(canonical)
+            files = state["user_audio_map"].setdefault(author_name, [])
+            if filename not in files:
+                files.append(filename)
+        await asyncio.to_thread(index.save)
+        state["after"] = cursor
+        checkpoint.save(state)
+
+    in_flight = None
+    tasks = []
+    try:
+        async for page in history_pages(client, channel_id, state["after"]):
+            tasks = [
+                asyncio.create_task(download(author_name, attachment))
+                for author_name, attachment in voice_attachments(page, tenant)
+            ]
+            if in_flight is not None:
+                await commit(*in_flight)
+            in_flight = (int(page[-1]["id"]), tasks)
+    except BaseException:
+        # Don't leave downloads running unowned; the checkpoint still ends
+        # before them, so a retry fetches them again
+        pending = set(tasks) | set(in_flight[1] if in_flight else ())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+    if in_flight is not None:
+        await commit(*in_flight)
+
+    checkpoint.clear()
+    return state["user_audio_map"]
+
+
+async def process_discord_messages(client, session, time_delta=None, tenant=None):
+    """
+    Fetch recent voice messages from the tenant's upload channel, download
+    them and write the speaker metadata file. Leaves the client running, so
+    a long-lived bot can call this repeatedly.
+    """
+    tenant = tenant or default_tenant()
+    # Ensure folders exist
+    voice_folder, voice_metadata_file = create_folders(tenant.download_folder)
+
+    channel = client.get_channel(tenant.upload_channel_id)
+    if not channel:
+        print(f"Could not find channel with ID {tenant.upload_channel_id}")
+        return False
+
+    time_delta = time_delta or timedelta(days=1)
+    user_audio_map = await scan_voice_messages(
+        client, session, tenant, voice_folder, time_delta
+    )
+
+    output_list = []
+    for name, files in user_audio_map.items():
+        output_list.append({"name": name, "audio_files": files})
+
+    with open(voice_metadata_file, "w", encoding="utf-8") as f:
+        json.dump(output_list, f, indent=4)
+    print(f"Data saved to {voice_metadata_file}")
+
+    # Render runs without a Discord login, so keep the cap it has to fit
+    send_channel = client.get_channel(tenant.send_channel_id)
+    if send_channel:
+        save_upload_limit(tenant.download_folder, send_channel.guild.filesize_limit)
+
+    return True  # Indicate success
 
 
 # This function will now be executed directly by the bot's event loop
@@ -56,68 +261,12 @@ async def process_discord_messages_and_shutdown(client):
     This is the core task that the bot will perform once it's ready.
     It fetches messages, downloads audio, saves data, and then shuts down the client.
     """
-    voice_folder, voice_metadata_file = create_folders()  # Ensure folders exist
-
     print("Starting message processing task...")
 
     # Create aiohttp session within this task's scope for clean closure
     async with aiohttp.ClientSession() as session:
         try:
-            channel = client.get_channel(config.UPLOAD_CHANNEL_ID)
-            if not channel:
-                print(f"Could not find channel with ID {config.UPLOAD_CHANNEL_ID}")
-                # If channel not found, still close gracefully
-                await client.close()
-                client.loop.stop()
-                return False
-
-            user_audio_map = {}
-            time_delta = timedelta(days=1)
-            recent_messages = await fetch_recent_messages(channel, time_delta)
-
-            for message in recent_messages:
-                if message.author.bot:
-                    continue
-
-                USER_MAP = {
-                    "lennyhuang": "Len",
-                    "pushinppalways": "Fee",
-                    "rajmehta23": "Raj",
-                    "browncrown": "Raj",
-                }
-
-                # Hush..... nothing is hardcoded i promise
-                author_name = "Sam"  # Fallback name goes here
-                # Shhh...
-
-                if message.author.name in USER_MAP:
-                    author_name = USER_MAP[message.author.name]
-
-                print(author_name)
-
-                for i, attachment in enumerate(message.attachments):
-                    if attachment.content_type and "audio" in attachment.content_type:
-                        print(
-                            f"Voice message: {attachment.filename} from {author_name}"
-                        )
-                        filename = await download_voice_attachment(
-                            author_name, attachment, session, voice_folder, i
-                        )
-                        print(filename)
-                        if filename:
-                            if author_name not in user_audio_map:
-                                user_audio_map[author_name] = []
-                            user_audio_map[author_name].append(filename)
-
-            output_list = []
-            for name, files in user_audio_map.items():
-                output_list.append({"name": name, "audio_files": files})
-
-            with open(voice_metadata_file, "w", encoding="utf-8") as f:
-                json.dump(output_list, f, indent=4)
-            print(f"Data saved to {voice_metadata_file}")
-
-            return True  # Indicate success
+            return await process_discord_messages(client, session)
 
         except Exception as e:
             print(f"Error during bot task: {e}")
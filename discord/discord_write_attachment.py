@@ -1,5 +1,7 @@
+import os
 import discord
 from config import config
+from podcast.export import load_upload_limit, save_upload_limit
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -7,6 +9,10 @@ intents.message_content = True
 
 client = discord.Client(intents=intents)
 
+PODCAST_MESSAGE = (
+    "Hey! Here's your podcast for this week. Lots lore-maxxing things to hear :)"
+)
+
 
 async def send_message(message: str, filename: str):
     """Sends a message with an attached file to the configured Discord channel."""
@@ -34,23 +40,49 @@ async def on_ready():
     await client.close()
 
 
-def send_attachment(*, message: str, file_path: str):
+async def send_podcast_file(channel, message: str, files: list):
+    """
+    Upload the rendered files to `channel`, one message per part. Render
+    already encoded them to fit the limit, so nothing is transcoded here.
+    """
+    try:
+        size_limit = channel.guild.filesize_limit
+        oversized = [p for p in files if os.path.getsize(p) > size_limit]
+        if oversized:
+            print(
+                f"{oversized[0]} is over this server's "
+                f"{size_limit / 1024 / 1024:.1f} MB limit; run render again"
+            )
+            return False
+        for i, path in enumerate(files, 1):
+            content = message
+            if len(files) > 1:
+                content = f"{message} (part {i}/{len(files)})"
+            with open(path, "rb") as file:
+                discord_file = discord.File(file)
+                await channel.send(content=content, file=discord_file)
+            print(f"Message and file '{path}' sent to {channel.id}")
+        return True
+    except FileNotFoundError as e:
+        print(f"File not found: {e.filename}")
+    except discord.errors.HTTPException as e:
+        print(f"Failed to send message: {e}")
+    return False
+
+
+def send_attachment(*, message: str, files: list):
     """Run the client and send the message with file."""
 
     async def send_and_close():
         channel = client.get_channel(config.SEND_CHANNEL_ID)
         if channel:
-            try:
-                with open(file_path, "rb") as file:
-                    discord_file = discord.File(file)
-                    await channel.send(content=message, file=discord_file)
-                print(
-                    f"Message and file '{file_path}' sent to {config.SEND_CHANNEL_ID}"
-                )
-            except FileNotFoundError:
-                print(f"File not found: {file_path}")
-            except discord.errors.HTTPException as e:
-                print(f"Failed to send message: {e}")
+            size_limit = channel.guild.filesize_limit
+            if config.DOWNLOAD_FOLDER and size_limit != load_upload_limit(
+                config.DOWNLOAD_FOLDER
+            ):
+                # Render sized the files for a stale cap; the next one won't
+                save_upload_limit(config.DOWNLOAD_FOLDER, size_limit)
+            await send_podcast_file(channel, message, files)
         else:
             print(f"Could not find channel with ID {config.SEND_CHANNEL_ID}")
         await client.close()
@@ -0,0 +1,218 @@
+"""
+Job Handlers
+What a worker does with each job kind, plus the submit-and-collect
+helpers generate_script and generate_podcast use when JOB_QUEUE is set.
+
+- "speaker": concat/transcribe/highlights/snippets for one speaker
+- "tts": synthesize one script line to an MP3 artifact
+"""
+
+import os
+import time
+import asyncio
+import traceback
+from .job_queue import DONE, FAILED, JobQueue, job_id
+
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+# Heavy objects are created once per worker process and reused across jobs
+_shared = {"extractor": None, "generator": None}
+
+
+def share(extractor=None, generator=None):
+    """Let a warm extractor/generator from the caller handle local jobs."""
+    if extractor is not None:
+        _shared["extractor"] = extractor
+    if generator is not None:
+        _shared["generator"] = generator
+
+
+def _extractor(highlight_mode: str):
+    extractor = _shared["extractor"]
+    if extractor is None or extractor.highlight_mode != highlight_mode:
+        from transcript.create_snippets import AudioSnippetExtractor
+
+        extractor = AudioSnippetExtractor(
+            os.getenv("OPENROUTER_API_KEY"), highlight_mode=highlight_mode
+        )
+        _shared["extractor"] = extractor
+    return extractor
+
+
+def _generator():
+    if _shared["generator"] is None:
+        from podcast.generate_podcast import SimplePodcastGenerator
+
+        _shared["generator"] = SimplePodcastGenerator(os.getenv("ELEVENLABS_API_KEY"))
+    return _shared["generator"]
+
+
+async def handle_speaker(payload: dict) -> dict:
+    from transcript import generate_transcript
+    from transcript.run_manifest import RunManifest
+
+    if payload["combined_format"] != generate_transcript.COMBINED_FORMAT:
+        raise RuntimeError(
+            f"Job wants COMBINED_FORMAT={payload['combined_format']}, "
+            f"this worker has {generate_transcript.COMBINED_FORMAT}"
+        )
+    paths = generate_transcript.ScriptPaths(
+        payload["download_folder"], payload["data_dir"]
+    )
+    person = generate_transcript.Metadata(**payload["person"])
+    manifest = RunManifest(paths.run_manifest_file)
+    text = await generate_transcript.process_speaker(
+        person, _extractor(payload["highlight_mode"]), manifest, paths
+    )
+
+    # What a later run needs on disk to reuse this result instead of redoing it
+    hashes = generate_transcript.stage_hashes(person, payload["highlight_mode"], paths)
+    snippets = manifest.get(person.name, "snippets", hashes["snippets"])
+    return {
+        "text": text,
+        "artifacts": [s["filepath"] for s in snippets or []],
+        # Fallback highlights aren't checkpointed, so the job shouldn't be either
+        "complete": snippets is not None,
+    }
+
+
+def tts_payload(generator, text: str, voice_id: str, artifact_dir: str) -> dict:
+    return {
+        "text": text,
+        "voice_id": voice_id,
+        "model_id": generator.tts_model_id,
+        "voice_settings": generator.voice_settings,
+        "artifact_dir": os.path.abspath(artifact_dir),
+    }
+
+
+def tts_artifact_path(payload: dict) -> str:
+    return os.path.join(payload["artifact_dir"], f"{job_id('tts', payload)}.mp3")
+
+
+async def handle_tts(payload: dict) -> dict:
+    generator = _generator()
+    generator.tts_model_id = payload["model_id"]
+    generator.voice_settings = payload["voice_settings"]
+    audio_bytes = await asyncio.to_thread(
+        generator.fetch_speech, payload["text"], payload["voice_id"]
+    )
+
+    os.makedirs(payload["artifact_dir"], exist_ok=True)
+    path = tts_artifact_path(payload)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(audio_bytes)
+    os.replace(tmp_path, path)
+    return {"path": path, "artifacts": [path]}
+
+
+HANDLERS = {"speaker": handle_speaker, "tts": handle_tts}
+
+
+async def execute(queue: JobQueue, job: dict):
+    """Run one claimed job and record its outcome on the queue."""
+    print(f"⚙️  Running {job['kind']} job {job['id'][:12]}")
+    try:
+        result = await HANDLERS[job["kind"]](job["payload"])
+    except (Exception, SystemExit) as e:
+        traceback.print_exc()
+        await asyncio.to_thread(queue.fail, job["id"], f"{type(e).__name__}: {e}")
+        return
+    await asyncio.to_thread(queue.complete, job["id"], result)
+
+
+def reusable(result) -> bool:
+    """Whether a finished job's outputs are all still on disk."""
+    if not result or not result.get("complete", True):
+        return False
+    return all(os.path.exists(path) for path in result.get("artifacts", []))
+
+
+def submit(queue: JobQueue, kind: str, payload: dict) -> str:
+    """
+    Submit a job, queueing it again if an earlier run finished it but its
+    outputs have since been deleted (or were never checkpointed).
+    """
+    id = job_id(kind, payload)
+    previous = queue.status([id]).get(id)
+    stale = (
+        previous is not None
+        and previous["status"] == DONE
+        and not reusable(previous["result"])
+    )
+    if stale:
+        print(
+            f"♻️  Re-running {kind} job {id[:12]}, its output is missing or incomplete"
+        )
+    return queue.submit(kind, payload, rerun=stale)
+
+
+async def collect(queue: JobQueue, kind: str, ids: list, work_locally=True) -> list:
+    """
+    Wait for `ids` to finish and return their results in order. While
+    waiting, claim and run pending jobs from this list ourselves, so the
+    pipeline still finishes when no other worker is running.
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    while True:
+        statuses = await asyncio.to_thread(queue.status, unique_ids)
+        failed = [i for i in unique_ids if statuses[i]["status"] == FAILED]
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} {kind} job(s) failed, first error: "
+                f"{statuses[failed[0]]['error']}"
+            )
+        pending = [i for i in unique_ids if statuses[i]["status"] != DONE]
+        if not pending:
+            return [statuses[i]["result"] for i in ids]
+
+        job = None
+        if work_locally:
+            job = await asyncio.to_thread(queue.claim, [kind], pending)
+        if job is not None:
+            await execute(queue, job)
+        else:
+            await asyncio.sleep(POLL_SECONDS)
+
+
+async def run_speaker_jobs(queue: JobQueue, metadata, paths, extractor) -> list:
+    """Queue one job per speaker and return their transcript texts in order."""
+    from transcript.generate_transcript import COMBINED_FORMAT, speaker_inputs
+
+    share(extractor=extractor)
+    ids = []
+    for person in metadata:
+        # Hashes come from the audio index, so unchanged files aren't reread
+        inputs = await asyncio.to_thread(speaker_inputs, person, paths, True)
+        payload = {
+            "person": person.model_dump(),
+            "download_folder": os.path.abspath(paths.download_folder),
+            "data_dir": os.path.abspath(paths.data_dir),
+            "highlight_mode": extractor.highlight_mode,
+            "combined_format": COMBINED_FORMAT,
+            # Content hashes make the job id change whenever the audio does
+            "input_hashes": [digest for _, digest in inputs],
+        }
+        ids.append(await asyncio.to_thread(submit, queue, "speaker", payload))
+    print(f"📬 Queued {len(ids)} speaker job(s)")
+    results = await collect(queue, "speaker", ids)
+    return [result["text"] for result in results]
+
+
+def run_tts_jobs(queue: JobQueue, generator, lines, artifact_dir) -> list:
+    """
+    Queue one job per (index, text, voice_id) line and return the MP3 paths
+    in order. Identical lines share one job, and so one API call.
+    """
+    share(generator=generator)
+    ids = []
+    for _, text, voice_id in lines:
+        payload = tts_payload(generator, text, voice_id, artifact_dir)
+        ids.append(submit(queue, "tts", payload))
+    print(f"📬 Queued {len(set(ids))} TTS job(s) for {len(ids)} line(s)")
+
+    started = time.perf_counter()
+    results = asyncio.run(collect(queue, "tts", ids))
+    print(f"🔊 TTS jobs finished in {time.perf_counter() - started:.1f}s")
+    return [result["path"] for result in results]
@@ -0,0 +1,205 @@
+"""
+Job Queue
+Serializable jobs for the expensive per-speaker and per-line work, on a
+pluggable queue. The SQLite backend only needs a file every worker can
+see (local disk, or a filesystem shared between machines).
+
+Jobs are identified by a content hash of their kind and payload, so
+submitting the same work twice (in one run or across runs) reuses the
+first result instead of queueing a duplicate.
+"""
+
+import os
+import abc
+import json
+import time
+import socket
+import sqlite3
+from contextlib import closing
+from typing import List, Optional
+from transcript.run_manifest import hash_value
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# A claimed job whose worker hasn't finished it after this long is requeued
+LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+def job_id(kind: str, payload: dict) -> str:
+    return hash_value(kind, payload)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue(abc.ABC):
+    """Interface every queue backend implements."""
+
+    @abc.abstractmethod
+    def submit(self, kind: str, payload: dict, rerun: bool = False) -> str:
+        """
+        Queue a job (or reuse an identical one) and return its id. `rerun`
+        queues an identical finished job again, e.g. when its output is gone.
+        """
+
+    @abc.abstractmethod
+    def claim(self, kinds: List[str], ids: Optional[List[str]] = None):
+        """Atomically take the next queued job, or None if there is none."""
+
+    @abc.abstractmethod
+    def complete(self, id: str, result):
+        pass
+
+    @abc.abstractmethod
+    def fail(self, id: str, error: str):
+        pass
+
+    @abc.abstractmethod
+    def status(self, ids: List[str]) -> dict:
+        """{id: {"status", "result", "error"}} for the given jobs."""
+
+
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    submitted_at REAL NOT NULL,
+                    claimed_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, kind)"
+            )
+
+    def _connect(self):
+        # Autocommit mode, so claim() can issue BEGIN IMMEDIATE itself
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return closing(conn)
+
+    def submit(self, kind: str, payload: dict, rerun: bool = False) -> str:
+        id = job_id(kind, payload)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, kind, payload, status, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (id, kind, json.dumps(payload), QUEUED, now),
+            )
+            # Give jobs that failed in an earlier run a fresh set of attempts
+            # (and, with rerun, finished ones whose output is gone)
+            statuses = [FAILED, DONE] if rerun else [FAILED]
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL, result = NULL "
+                f"WHERE id = ? AND status IN ({','.join('?' * len(statuses))})",
+                (QUEUED, id, *statuses),
+            )
+        return id
+
+    def claim(self, kinds: List[str], ids: Optional[List[str]] = None):
+        now = time.time()
+        with self._connect() as conn:
+            return self._claim(conn, now, kinds, ids)
+
+    def _claim(self, conn, now, kinds, ids):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL "
+                "WHERE status = ? AND claimed_at < ?",
+                (QUEUED, RUNNING, now - LEASE_SECONDS),
+            )
+            query = (
+                f"SELECT * FROM jobs WHERE status = ? "
+                f"AND kind IN ({','.join('?' * len(kinds))})"
+            )
+            params = [QUEUED, *kinds]
+            if ids is not None:
+                query += f" AND id IN ({','.join('?' * len(ids))})"
+                params += list(ids)
+            row = conn.execute(
+                query + " ORDER BY submitted_at LIMIT 1", params
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, claimed_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker_name(), now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return {
+                "id": row["id"],
+                "kind": row["kind"],
+                "payload": json.loads(row["payload"]),
+            }
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def complete(self, id: str, result):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, "
+                "finished_at = ? WHERE id = ?",
+                (DONE, json.dumps(result), time.time(), id),
+            )
+
+    def fail(self, id: str, error: str):
+        with self._connect() as conn:
+            # Retry until the job has used up its attempts
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, worker = NULL, finished_at = ? WHERE id = ?",
+                (MAX_ATTEMPTS, FAILED, QUEUED, error, time.time(), id),
+            )
+
+    def status(self, ids: List[str]) -> dict:
+        statuses = {}
+        with self._connect() as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                rows = conn.execute(
+                    f"SELECT id, status, result, error FROM jobs "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    statuses[row["id"]] = {
+                        "status": row["status"],
+                        "result": json.loads(row["result"]) if row["result"] else None,
+                        "error": row["error"],
+                    }
+        return statuses
+
+
+def get_queue(url: str = None) -> Optional[JobQueue]:
+    """
+    Build a queue from JOB_QUEUE (or `url`). Accepts a plain path or a
+    sqlite:// URL; returns None when no queue is configured, in which case
+    callers run their jobs inline.
+    """
+    url = url if url is not None else os.getenv("JOB_QUEUE")
+    if not url:
+        return None
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://") :]
+    return SQLiteJobQueue(url)
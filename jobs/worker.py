@@ -0,0 +1,55 @@
+"""
+Job Worker
+Pulls speaker and TTS jobs off the queue until stopped. Run as many as
+you like, on this machine or any other that shares the queue file and
+the data folders:
+
+    JOB_QUEUE=/shared/ptg/jobs.sqlite python -m jobs.worker --kinds speaker
+"""
+
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from .job_queue import get_queue
+from .handlers import HANDLERS, POLL_SECONDS, execute
+
+load_dotenv()
+
+
+async def work(queue, kinds, once=False):
+    print(f"👷 Worker started for {', '.join(kinds)} jobs")
+    while True:
+        job = await asyncio.to_thread(queue.claim, kinds)
+        if job is None:
+            if once:
+                return
+            await asyncio.sleep(POLL_SECONDS)
+            continue
+        await execute(queue, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pass The Gavel job worker")
+    parser.add_argument(
+        "--kinds",
+        default=",".join(HANDLERS),
+        help=f"comma-separated job kinds to take (default: {','.join(HANDLERS)})",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="exit when the queue is empty"
+    )
+    args = parser.parse_args()
+
+    queue = get_queue()
+    if queue is None:
+        parser.error("JOB_QUEUE is not set")
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in HANDLERS]
+    if unknown:
+        parser.error(f"unknown job kind(s): {unknown}")
+
+    asyncio.run(work(queue, kinds, args.once))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,125 @@
-from discord.discord_filtered_read import get_messages
-from discord.discord_write_attachment import send_attachment
-from transcript.generate_transcript import generate_script_sync
-from podcast.generate_podcast import generate_podcast_from_data
+import sys
+import argparse
+import importlib
 
+# Each stage's module is only imported when that stage runs, so e.g. a
+# Discord ingest never pays for torch/whisper/openai/pydub.
+STAGE_MODULES = {
+    "ingest": "discord.discord_filtered_read",
+    "transcribe": "transcript.generate_transcript",
+    "script": "transcript.generate_transcript",
+    "render": "podcast.generate_podcast",
+    "publish": "discord.discord_write_attachment",
+    "daemon": "daemon",
+    "tenants": "run_tenants",
+    "plan": "plan",
+}
 
-def main():
+PODCAST_BASE = "data/podcast"
+
+
+def load_stage(name: str):
+    return importlib.import_module(STAGE_MODULES[name])
+
+
+def ingest():
     # Get messages from discord
-    if not get_messages():
+    if not load_stage("ingest").get_messages():
         print("Failed to get messages")
 
+
+def transcribe():
+    # Concat, transcribe and cut highlight snippets for every speaker
+    load_stage("transcribe").transcribe_speakers_sync()
+
+
+def script():
     # Generate highlights of snippets based on audio and transcript.json
-    generate_script_sync()
+    load_stage("script").generate_script_sync()
+
+
+def render():
+    # Create podcast, sized for the upload cap the last ingest recorded
+    from config import config
+    from podcast.export import load_upload_limit
+
+    return load_stage("render").generate_podcast_from_data(
+        size_limit=load_upload_limit(config.DOWNLOAD_FOLDER)
+    )
+
+
+def publish(files=None):
+    # Forward the podcast to Discord (by default the last render's upload files)
+    if files is None:
+        from podcast.export import upload_files
 
-    # Create podcast
-    generate_podcast_from_data()
+        files = upload_files(PODCAST_BASE)
+    stage = load_stage("publish")
+    stage.send_attachment(message=stage.PODCAST_MESSAGE, files=files)
 
-    # Forward the podcast to Discord
-    file_path = "data/podcast.mp3"
-    message = (
-        "Hey! Here's your podcast for this week. Lots lore-maxxing things to hear :)"
+
+def daemon():
+    load_stage("daemon").main()
+
+
+def tenants():
+    # Every tenant in tenants.json, sharing one process and one Whisper model
+    load_stage("tenants").main()
+
+
+def plan(argv=()):
+    # Estimate time, API usage and episode length without running anything
+    load_stage("plan").main(list(argv))
+
+
+COMMANDS = {
+    "ingest": ingest,
+    "transcribe": transcribe,
+    "script": script,
+    "render": render,
+    "publish": publish,
+    "daemon": daemon,
+    "tenants": tenants,
+    "plan": plan,
+}
+
+
+def run_all():
+    # script resumes from the per-speaker run manifest, so it covers transcribe
+    ingest()
+    script()
+    podcast_files = render()
+    if not podcast_files:
+        print("Nothing to publish")
+        return
+    publish(podcast_files)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pass The Gavel podcast pipeline")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="all",
+        choices=["all", *COMMANDS],
+        help="stage to run (default: the whole pipeline)",
+    )
+    parser.add_argument(
+        "options",
+        nargs=argparse.REMAINDER,
+        help="options for the stage (plan only, see `main.py plan --help`)",
     )
-    send_attachment(message=message, file_path=file_path)
+    args = parser.parse_args(argv)
+    if args.options and args.command != "plan":
+        parser.error(f"unrecognized arguments: {' '.join(args.options)}")
+
+    if args.command == "all":
+        run_all()
+    elif args.command == "plan":
+        plan(args.options)
+    else:
+        COMMANDS[args.command]()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,451 @@
+"""
+Episode planner
+Estimates what the next run will cost before doing any of it: Whisper
+time, OpenRouter tokens, ElevenLabs characters and the episode length.
+
+Inputs are only read cheaply: ptg_discord_data.json, audio durations from
+the container headers, the run manifest, existing transcripts, an existing
+transcript.json and the TTS cache. Rates come from run_stats.jsonl (what
+past runs measured), falling back to the defaults below until there is
+history.
+"""
+
+import os
+import json
+import argparse
+from dotenv import load_dotenv
+
+import run_stats
+from transcript.audio_formats import probe_duration
+from transcript.generate_transcript import (
+    PROMPT_FILE,
+    SCRIPT_MAX_TOKENS,
+    ScriptPaths,
+    get_metadata,
+    load_transcript,
+    payload_transcript_file,
+    speaker_inputs,
+    stage_hashes,
+)
+from transcript.run_manifest import RunManifest
+
+load_dotenv()
+
+# Defaults used until run_stats.jsonl has measurements for a stage
+DEFAULT_WHISPER_RTF = 0.5  # wall seconds per audio second, base model on CPU
+DEFAULT_CHARS_PER_AUDIO_SECOND = 14.0
+DEFAULT_TOKENS_PER_CHAR = 0.25
+DEFAULT_HIGHLIGHT_TOKENS_PER_CHAR = 0.6  # segment JSON roughly doubles the text
+DEFAULT_HIGHLIGHT_COMPLETION_TOKENS = 200
+DEFAULT_LLM_SECONDS = 8.0
+DEFAULT_SCRIPT_LLM_SECONDS = 40.0
+DEFAULT_SCRIPT_SPEECH_CHARS_PER_TOKEN = 3.0  # spoken text per completion token
+DEFAULT_SNIPPET_SECONDS = 15.0
+SNIPPETS_PER_SPEAKER = 2
+DEFAULT_TTS_SECONDS_PER_CHAR = 0.02
+DEFAULT_SPEECH_SECONDS_PER_CHAR = 0.065
+DEFAULT_ASSEMBLY_RTF = 0.05  # mix + export wall seconds per episode second
+# Per-speaker JSON keys/punctuation in the script prompt
+SCRIPT_PROMPT_CHARS_PER_SPEAKER = 40
+RENDER_PAUSE_MS = 200  # generate_podcast_from_data's pause
+
+
+class Calibration:
+    """Rates derived from past runs, with where each one came from."""
+
+    def __init__(self, path: str = None):
+        self.stats = run_stats.load(path)
+        self.sources = {}
+
+    def ratio(self, name, stage, numerator, denominator, default, **match):
+        records = self._records(stage, match)
+        self.sources[name] = self._source(records, numerator)
+        return run_stats.median_ratio(records, numerator, denominator, default)
+
+    def value(self, name, stage, field, default, **match):
+        records = self._records(stage, match)
+        self.sources[name] = self._source(records, field)
+        return run_stats.median_value(records, field, default)
+
+    def _records(self, stage, match):
+        return [
+            r
+            for r in self.stats.get(stage, [])
+            if all(r.get(k) == v for k, v in match.items())
+        ]
+
+    @staticmethod
+    def _source(records, field):
+        count = sum(1 for r in records if r.get(field) is not None)
+        count = min(count, run_stats.CALIBRATION_WINDOW)
+        return f"{count} past run(s)" if count else "default"
+
+
+def _speaker_plan(person, paths, manifest, highlight_mode, cal, rates, seen):
+    """
+    One speaker's share of the work. `seen` collects the audio payloads and
+    highlight inputs already planned for earlier speakers, which the run
+    will reuse rather than redo.
+    """
+    name = person.name.lower()
+    try:
+        # plan only reads; leave the audio index to the pipeline
+        inputs = speaker_inputs(person, paths, quiet=True, save=False)
+    except OSError:
+        # Missing files: nothing to hash, so nothing can be reused either
+        inputs = [(os.path.join(paths.audio_dir, f), None) for f in person.audio_files]
+    durations = [probe_duration(p) if os.path.exists(p) else None for p, _ in inputs]
+    audio_seconds = sum(d for d in durations if d)
+    plan = {
+        "name": person.name,
+        "files": len(person.audio_files),
+        "unique_files": len(inputs),
+        "unreadable_files": sum(1 for d in durations if d is None),
+        "audio_seconds": audio_seconds,
+    }
+
+    hashes = {}
+    if all(digest for _, digest in inputs):
+        hashes = stage_hashes(person, highlight_mode, paths, inputs)
+    transcript_file = os.path.join(paths.transcripts_dir, f"{name}.json")
+    transcript_cached = (
+        hashes
+        and manifest.get(person.name, "transcript", hashes["transcript"])
+        and os.path.exists(transcript_file)
+    )
+    plan["whisper_seconds"] = 0.0
+    if transcript_cached:
+        plan["transcript_chars"] = len(load_transcript(transcript_file)["full_text"])
+    else:
+        # Whisper runs once per unique payload, ever
+        plan["transcript_chars"] = 0
+        for (_, digest), duration in zip(inputs, durations):
+            duration = duration or 0.0
+            cache_file = payload_transcript_file(paths, digest) if digest else ""
+            if digest and os.path.exists(cache_file):
+                text = load_transcript(cache_file)["full_text"]
+                plan["transcript_chars"] += len(text)
+                continue
+            plan["transcript_chars"] += duration * rates["chars_per_audio_second"]
+            if digest not in seen["payloads"]:
+                plan["whisper_seconds"] += duration * rates["whisper_rtf"]
+            if digest:
+                seen["payloads"].add(digest)
+    plan["transcript_cached"] = bool(transcript_cached)
+
+    highlights_cached = bool(
+        hashes
+        and (
+            manifest.find("highlights", hashes["highlights"]) is not None
+            or hashes["highlights"] in seen["highlights"]
+        )
+    )
+    if hashes:
+        seen["highlights"].add(hashes["highlights"])
+    plan["highlights_cached"] = highlights_cached
+    if highlights_cached or highlight_mode == "local":
+        plan["highlight_prompt_tokens"] = 0
+        plan["highlight_completion_tokens"] = 0
+        plan["highlight_seconds"] = 0.0
+    else:
+        plan["highlight_prompt_tokens"] = plan["transcript_chars"] * cal.ratio(
+            "highlight_tokens_per_char",
+            "highlights_llm",
+            "prompt_tokens",
+            "transcript_chars",
+            DEFAULT_HIGHLIGHT_TOKENS_PER_CHAR,
+            mode=highlight_mode,
+        )
+        plan["highlight_completion_tokens"] = rates["highlight_completion_tokens"]
+        plan["highlight_seconds"] = rates["highlight_seconds"]
+    return plan
+
+
+def _tts_cache_hits(segments, generator, data_dir, queued):
+    """Speech segments whose TTS artifact from an earlier render still exists."""
+    from podcast.script_schema import SpeechSegment
+    from jobs.handlers import tts_artifact_path, tts_payload
+
+    voice_mapping = generator.assign_voices(segments)
+
+    def cached(index, segment):
+        voice_id = voice_mapping[segment.speaker]
+        if queued:
+            payload = tts_payload(
+                generator, segment.text, voice_id, os.path.join(data_dir, "tts_cache")
+            )
+            return os.path.exists(tts_artifact_path(payload))
+        return os.path.exists(
+            generator.speech_artifact_path(
+                os.path.join(data_dir, "tts_segments"), index, segment.text, voice_id
+            )
+        )
+
+    return [
+        segment
+        for index, segment in enumerate(segments)
+        if isinstance(segment, SpeechSegment) and cached(index, segment)
+    ]
+
+
+def _render_plan(paths, speaker_count, script_completion_tokens, cal):
+    """TTS characters and episode length, exact when transcript.json exists."""
+    from jobs.job_queue import get_queue
+
+    speech_spc = cal.ratio(
+        "speech_seconds_per_char",
+        "render",
+        "speech_seconds",
+        "speech_chars",
+        DEFAULT_SPEECH_SECONDS_PER_CHAR,
+    )
+    plan = {"script_exists": os.path.exists(paths.script_file)}
+
+    if plan["script_exists"]:
+        from podcast.script_schema import (
+            SnippetSegment,
+            SpeechSegment,
+            load_script,
+            resolve_snippets,
+        )
+
+        segments = load_script(paths.script_file)
+        speech = [s for s in segments if isinstance(s, SpeechSegment)]
+        plan["speech_chars"] = sum(len(s.text) for s in speech)
+        try:
+            snippet_files = resolve_snippets(segments, paths.data_dir)
+            plan["missing_snippets"] = []
+        except FileNotFoundError as e:
+            snippet_files = {}
+            plan["missing_snippets"] = [str(e)]
+        plan["snippet_seconds"] = sum(
+            probe_duration(snippet_files[s.snippet]) or 0.0
+            for s in segments
+            if isinstance(s, SnippetSegment) and s.snippet in snippet_files
+        )
+        pauses = len(segments) - 1
+
+        from podcast.generate_podcast import SimplePodcastGenerator
+
+        hits = _tts_cache_hits(
+            segments,
+            SimplePodcastGenerator(),
+            paths.data_dir,
+            queued=get_queue() is not None,
+        )
+        plan["tts_cached_chars"] = sum(len(s.text) for s in hits)
+    else:
+        plan["speech_chars"] = cal.value(
+            "speech_chars",
+            "render",
+            "speech_chars",
+            script_completion_tokens * DEFAULT_SCRIPT_SPEECH_CHARS_PER_TOKEN,
+        )
+        snippets = speaker_count * SNIPPETS_PER_SPEAKER
+        plan["snippet_seconds"] = cal.value(
+            "snippet_seconds",
+            "render",
+            "snippet_seconds",
+            snippets * DEFAULT_SNIPPET_SECONDS,
+        )
+        plan["missing_snippets"] = []
+        plan["tts_cached_chars"] = 0
+        # Every snippet sits between two host lines
+        pauses = 2 * snippets
+
+    plan["tts_chars"] = plan["speech_chars"] - plan["tts_cached_chars"]
+    plan["episode_seconds"] = (
+        plan["speech_chars"] * speech_spc
+        + plan["snippet_seconds"]
+        + pauses * RENDER_PAUSE_MS / 1000
+    )
+    plan["tts_seconds"] = plan["tts_chars"] * cal.ratio(
+        "tts_seconds_per_char", "tts", "seconds", "chars", DEFAULT_TTS_SECONDS_PER_CHAR
+    )
+    # Whatever render time wasn't spent waiting on TTS: decode, mix, export
+    for record in cal.stats.get("render", []):
+        if record.get("tts_seconds") is not None:
+            record["assembly_seconds"] = record["seconds"] - record["tts_seconds"]
+    plan["assembly_seconds"] = plan["episode_seconds"] * cal.ratio(
+        "assembly_rtf",
+        "render",
+        "assembly_seconds",
+        "episode_seconds",
+        DEFAULT_ASSEMBLY_RTF,
+    )
+    return plan
+
+
+def plan_episode(paths: ScriptPaths = None, highlight_mode: str = None) -> dict:
+    """Project the next run's per-stage time and API usage."""
+    paths = paths or ScriptPaths()
+    highlight_mode = highlight_mode or os.getenv("HIGHLIGHT_MODE") or "llm"
+    cal = Calibration()
+    manifest = RunManifest(paths.run_manifest_file)
+
+    rates = {
+        "whisper_rtf": cal.ratio(
+            "whisper_rtf", "whisper", "seconds", "audio_seconds", DEFAULT_WHISPER_RTF
+        ),
+        "chars_per_audio_second": cal.ratio(
+            "chars_per_audio_second",
+            "whisper",
+            "chars",
+            "audio_seconds",
+            DEFAULT_CHARS_PER_AUDIO_SECOND,
+        ),
+        "highlight_completion_tokens": cal.value(
+            "highlight_completion_tokens",
+            "highlights_llm",
+            "completion_tokens",
+            DEFAULT_HIGHLIGHT_COMPLETION_TOKENS,
+            mode=highlight_mode,
+        ),
+        "highlight_seconds": cal.value(
+            "highlight_seconds",
+            "highlights_llm",
+            "seconds",
+            DEFAULT_LLM_SECONDS,
+            mode=highlight_mode,
+        ),
+    }
+
+    metadata = get_metadata(paths.metadata_file)
+    seen = {"payloads": set(), "highlights": set()}
+    speakers = [
+        _speaker_plan(person, paths, manifest, highlight_mode, cal, rates, seen)
+        for person in metadata
+    ]
+
+    # The script is rewritten on every run
+    system_chars = os.path.getsize(PROMPT_FILE) if os.path.exists(PROMPT_FILE) else 0
+    script_prompt_chars = (
+        system_chars
+        + sum(s["transcript_chars"] for s in speakers)
+        + SCRIPT_PROMPT_CHARS_PER_SPEAKER * len(speakers)
+    )
+    script = {
+        "prompt_tokens": script_prompt_chars
+        * cal.ratio(
+            "script_tokens_per_char",
+            "script_llm",
+            "prompt_tokens",
+            "prompt_chars",
+            DEFAULT_TOKENS_PER_CHAR,
+        ),
+        "completion_tokens": cal.value(
+            "script_completion_tokens",
+            "script_llm",
+            "completion_tokens",
+            SCRIPT_MAX_TOKENS * 0.75,
+        ),
+        "seconds": cal.value(
+            "script_seconds", "script_llm", "seconds", DEFAULT_SCRIPT_LLM_SECONDS
+        ),
+    }
+    render = _render_plan(paths, len(speakers), script["completion_tokens"], cal)
+
+    stages = {
+        "whisper": sum(s["whisper_seconds"] for s in speakers),
+        "highlights": sum(s["highlight_seconds"] for s in speakers),
+        "script": script["seconds"],
+        "tts": render["tts_seconds"],
+        "assembly": render["assembly_seconds"],
+    }
+    return {
+        "highlight_mode": highlight_mode,
+        "speakers": speakers,
+        "script": script,
+        "render": render,
+        "stage_seconds": stages,
+        "total_seconds": sum(stages.values()),
+        "openrouter_tokens": {
+            "prompt": sum(s["highlight_prompt_tokens"] for s in speakers)
+            + script["prompt_tokens"],
+            "completion": sum(s["highlight_completion_tokens"] for s in speakers)
+            + script["completion_tokens"],
+        },
+        "elevenlabs_chars": render["tts_chars"],
+        "episode_seconds": render["episode_seconds"],
+        "calibration": cal.sources,
+    }
+
+
+def _minutes(seconds: float) -> str:
+    return f"{seconds / 60:.1f} min" if seconds >= 60 else f"{seconds:.0f}s"
+
+
+def print_plan(plan: dict):
+    print(f"🧮 Plan for {len(plan['speakers'])} speaker(s)")
+    for s in plan["speakers"]:
+        cached = []
+        if s["transcript_cached"]:
+            cached.append("transcript")
+        if s["highlights_cached"]:
+            cached.append("highlights")
+        note = f" (reusing {', '.join(cached)})" if cached else ""
+        if s["unique_files"] < s["files"]:
+            note += f" ({s['files'] - s['unique_files']} duplicate file(s))"
+        if s["unreadable_files"]:
+            note += f" ⚠️ {s['unreadable_files']} file(s) without a duration"
+        print(
+            f"  {s['name']}: {s['files']} file(s), "
+            f"{_minutes(s['audio_seconds'])} of audio{note}"
+        )
+
+    print("\n⏱️  Projected time")
+    for stage, seconds in plan["stage_seconds"].items():
+        print(f"  {stage:<11}{_minutes(seconds)}")
+    print(f"  {'total':<11}{_minutes(plan['total_seconds'])}")
+
+    tokens = plan["openrouter_tokens"]
+    render = plan["render"]
+    print("\n💳 API usage")
+    print(
+        f"  OpenRouter: ~{tokens['prompt']:,.0f} prompt + "
+        f"~{tokens['completion']:,.0f} completion tokens "
+        f"(highlights: {plan['highlight_mode']})"
+    )
+    cached = (
+        f", {render['tts_cached_chars']:,} cached" if render["tts_cached_chars"] else ""
+    )
+    source = "transcript.json" if render["script_exists"] else "estimate"
+    print(
+        f"  ElevenLabs: ~{plan['elevenlabs_chars']:,.0f} characters "
+        f"({source}{cached})"
+    )
+    for missing in render["missing_snippets"]:
+        print(f"  ⚠️ {missing}")
+
+    print(f"\n🎧 Episode length: ~{_minutes(plan['episode_seconds'])}")
+    calibrated = {k: v for k, v in plan["calibration"].items() if v != "default"}
+    if calibrated:
+        print(f"📏 Calibrated from run_stats: {', '.join(sorted(calibrated))}")
+    else:
+        print(f"📏 No run history in {run_stats.RUN_STATS_FILE}; using defaults")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate the next episode's cost")
+    parser.add_argument("--download-folder", help="defaults to DOWNLOAD_FOLDER")
+    parser.add_argument("--data-dir", help="defaults to ./data")
+    parser.add_argument("--highlight-mode", help="defaults to HIGHLIGHT_MODE")
+    parser.add_argument("--json", action="store_true", help="print the raw plan")
+    args = parser.parse_args(argv)
+
+    paths = ScriptPaths(args.download_folder, args.data_dir)
+    try:
+        plan = plan_episode(paths, args.highlight_mode)
+    except FileNotFoundError as e:
+        if e.filename != paths.metadata_file:
+            raise
+        parser.exit(1, f"No {paths.metadata_file}; run ingest first\n")
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print_plan(plan)
+    return plan
+
+
+if __name__ == "__main__":
+    main()
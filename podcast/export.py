@@ -0,0 +1,336 @@
+"""
+Podcast Export
+Tees the assembled PCM into one encoder per output format, all running
+concurrently, with optional EBU R128 loudness targeting.
+"""
+
+import os
+import json
+import math
+import time
+import subprocess
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+
+# pydub is only imported where it is used, so the publish step stays light
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+# name -> (extension, ffmpeg output args)
+EXPORT_FORMATS = {
+    "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "192k"]),
+    # libopus only accepts 48 kHz-family rates
+    "opus": (
+        ".opus",
+        ["-c:a", "libopus", "-b:a", "64k", "-application", "voip", "-ar", "48000"],
+    ),
+    "aac": (".m4a", ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"]),
+    "preview": ("_preview.mp3", ["-c:a", "libmp3lame", "-b:a", "48k", "-ac", "1"]),
+    "flac": (".flac", ["-c:a", "flac"]),
+}
+
+# Comma-separated names from EXPORT_FORMATS, e.g. "mp3,opus,preview". The
+# first one is the file that gets published
+PODCAST_FORMATS = [
+    f.strip()
+    for f in (os.getenv("PODCAST_EXPORT_FORMATS") or "mp3").split(",")
+    if f.strip()
+] or ["mp3"]
+
+DEFAULT_LOUDNESS_LUFS = -16.0  # common podcast target
+TRUE_PEAK_DB = -1.5
+LOUDNESS_RANGE = 11.0
+
+
+def loudnorm_filter(target_lufs: float) -> str:
+    return f"loudnorm=I={target_lufs}:TP={TRUE_PEAK_DB}:LRA={LOUDNESS_RANGE}"
+
+
+def output_path(output_base: str, format: str) -> str:
+    return f"{output_base}{EXPORT_FORMATS[format][0]}"
+
+
+def published_path(output_base: str) -> str:
+    """The file export_podcast writes for the first configured format."""
+    return output_path(output_base, PODCAST_FORMATS[0])
+
+
+def _encode(audio: "AudioSegment", pcm: memoryview, path: str, codec_args, filters):
+    """Run one ffmpeg encoder fed from the shared PCM buffer."""
+    command = [
+        audio.converter,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        f"s{audio.sample_width * 8}le",
+        "-ar",
+        str(audio.frame_rate),
+        "-ac",
+        str(audio.channels),
+        "-i",
+        "pipe:0",
+    ]
+    if filters:
+        # loudnorm upsamples internally, so pin the output rate back
+        command += ["-af", filters, "-ar", str(audio.frame_rate)]
+    command += list(codec_args) + [path]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+    )
+    _, stderr = process.communicate(input=pcm)
+    elapsed = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed encoding {path}: {stderr.decode(errors='replace').strip()}"
+        )
+    return elapsed
+
+
+def export_podcast(
+    audio: "AudioSegment",
+    output_base: str,
+    formats=("mp3",),
+    loudness_lufs=None,
+    size_limit=None,
+):
+    """
+    Encode `audio` to every format in `formats` concurrently.
+
+    The PCM is rendered once and the same buffer is streamed into each
+    encoder's stdin, so nothing is re-decoded or re-encoded per format.
+    Returns {format: {"path", "seconds", "bytes"}}.
+
+    With `size_limit`, the upload's codec, bitrate and parts are planned
+    from the duration before anything is encoded. An exported format
+    expected to fit is reused; otherwise the upload is one more encoder in
+    the same pass. results["upload"]["paths"] lists files
+    that are each checked to be under the limit.
+    """
+    unknown = [f for f in formats if f not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(
+            f"Unknown export format(s) {unknown}, expected any of {list(EXPORT_FORMATS)}"
+        )
+
+    filters = loudnorm_filter(loudness_lufs) if loudness_lufs is not None else None
+    pcm = memoryview(audio.raw_data)
+    duration = len(audio) / 1000
+
+    jobs = {
+        format: (output_path(output_base, format), EXPORT_FORMATS[format][1])
+        for format in formats
+    }
+    plan = reused = None
+    if size_limit is not None:
+        reused = _fitting_format(formats, duration, size_limit)
+        if reused is not None:
+            codec, kbps = LADDER_SETTINGS[reused]
+            plan = {"codec": codec, "kbps": kbps, "parts": 1}
+        else:
+            plan = plan_for_size(duration, size_limit)
+            jobs["upload"] = _upload_job(output_base, plan, duration)
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = {
+            name: pool.submit(_encode, audio, pcm, path, codec_args, filters)
+            for name, (path, codec_args) in jobs.items()
+        }
+        results = {}
+        for name, future in futures.items():
+            seconds = future.result()
+            if name == "upload":
+                continue
+            path = jobs[name][0]
+            results[name] = {
+                "path": path,
+                "seconds": seconds,
+                "bytes": os.path.getsize(path),
+            }
+
+    for format, result in results.items():
+        print(
+            f"   {format:>8}: {result['path']} "
+            f"({result['bytes'] / 1024 / 1024:.1f} MB, encoded in {result['seconds']:.1f}s)"
+        )
+
+    if plan is not None:
+        if reused is not None:
+            paths = [results[reused]["path"]]
+        else:
+            paths = _upload_paths(output_base, plan)
+        paths, plan = _check_upload(
+            audio, pcm, filters, output_base, plan, paths, duration, size_limit
+        )
+        results["upload"] = {"paths": paths, "plan": plan}
+        _write_upload_list(output_base, paths)
+    elif os.path.exists(f"{output_base}_upload.json"):
+        # An earlier size-limited export's list would point at stale files
+        os.remove(f"{output_base}_upload.json")
+    return results
+
+
+# Size-aware encoding for upload caps (e.g. Discord's per-guild file limit)
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024  # Discord's cap for unboosted servers
+# Written by ingest into the download folder, read back by render
+UPLOAD_LIMIT_FILE = "upload_limit.json"
+UPLOAD_SAFETY_MARGIN = 0.95
+CONTAINER_OVERHEAD = 1.03
+SIZE_CODECS = {
+    "mp3": (".mp3", ["-c:a", "libmp3lame"]),
+    "opus": (".opus", ["-c:a", "libopus", "-application", "voip", "-ar", "48000"]),
+}
+# Tried best-first; the first setting whose estimate fits the budget wins
+SIZE_LADDER = [
+    ("mp3", 192),
+    ("mp3", 128),
+    ("opus", 96),
+    ("opus", 64),
+    ("opus", 48),
+    ("opus", 32),
+]
+# Quality to keep when even the bottom of the ladder is too big
+SPLIT_SETTING = ("opus", 48)
+# Export formats that encode with the same settings as a ladder step
+LADDER_SETTINGS = {"mp3": ("mp3", 192), "opus": ("opus", 64)}
+
+
+def estimate_bytes(duration_seconds: float, kbps: int) -> float:
+    return duration_seconds * kbps * 1000 / 8 * CONTAINER_OVERHEAD
+
+
+def plan_for_size(duration_seconds: float, size_limit: int) -> dict:
+    """Pick codec, bitrate and number of parts so every file fits the cap."""
+    budget = size_limit * UPLOAD_SAFETY_MARGIN
+    for codec, kbps in SIZE_LADDER:
+        if estimate_bytes(duration_seconds, kbps) <= budget:
+            return {"codec": codec, "kbps": kbps, "parts": 1}
+
+    codec, kbps = SPLIT_SETTING
+    parts = math.ceil(estimate_bytes(duration_seconds, kbps) / budget)
+    return {"codec": codec, "kbps": kbps, "parts": parts}
+
+
+def smaller_plan(plan: dict) -> dict:
+    """The next setting down, for when an encode came out over the cap."""
+    setting = (plan["codec"], plan["kbps"])
+    if plan["parts"] == 1 and setting in SIZE_LADDER:
+        lower = SIZE_LADDER[SIZE_LADDER.index(setting) + 1 :]
+        if lower:
+            return {"codec": lower[0][0], "kbps": lower[0][1], "parts": 1}
+    codec, kbps = SPLIT_SETTING
+    return {"codec": codec, "kbps": kbps, "parts": max(2, plan["parts"] + 1)}
+
+
+def _fitting_format(formats, duration: float, size_limit: int):
+    """The best exported format whose estimate fits the cap, if any."""
+    budget = size_limit * UPLOAD_SAFETY_MARGIN
+    fitting = [
+        f
+        for f in formats
+        if f in LADDER_SETTINGS
+        and estimate_bytes(duration, LADDER_SETTINGS[f][1]) <= budget
+    ]
+    return min(
+        fitting, key=lambda f: SIZE_LADDER.index(LADDER_SETTINGS[f]), default=None
+    )
+
+
+def _upload_job(output_base: str, plan: dict, duration: float):
+    """(output path or segment pattern, ffmpeg args) encoding `plan`."""
+    extension, codec_args = SIZE_CODECS[plan["codec"]]
+    upload_base = f"{output_base}_upload"
+    # Clear files left over from an earlier, longer or differently split episode
+    for stale in _part_files(upload_base, extension):
+        os.remove(stale)
+    args = codec_args + ["-b:a", f"{plan['kbps']}k"]
+    if plan["parts"] == 1:
+        return f"{upload_base}{extension}", args
+    args += [
+        "-f",
+        "segment",
+        "-segment_time",
+        f"{duration / plan['parts']:.3f}",
+        "-reset_timestamps",
+        "1",
+    ]
+    return f"{upload_base}_part%02d{extension}", args
+
+
+def _upload_paths(output_base: str, plan: dict):
+    extension = SIZE_CODECS[plan["codec"]][0]
+    upload_base = f"{output_base}_upload"
+    if plan["parts"] == 1:
+        return [f"{upload_base}{extension}"]
+    return _part_files(f"{upload_base}_part", extension)
+
+
+def _check_upload(audio, pcm, filters, output_base, plan, paths, duration, size_limit):
+    """
+    Estimates are only estimates (VBR, container overhead), so measure what
+    was written and re-encode from the PCM one step smaller if needed.
+    Returns the paths and the plan they were encoded with.
+    """
+    for _ in range(len(SIZE_LADDER) + 4):
+        oversized = [p for p in paths if os.path.getsize(p) > size_limit]
+        if not oversized:
+            return paths, plan
+        plan = smaller_plan(plan)
+        print(
+            f"📦 {oversized[0]} is over {size_limit / 1024 / 1024:.1f} MB, "
+            f"re-encoding as {plan['codec']} {plan['kbps']}k in {plan['parts']} part(s)"
+        )
+        path, codec_args = _upload_job(output_base, plan, duration)
+        _encode(audio, pcm, path, codec_args, filters)
+        paths = _upload_paths(output_base, plan)
+    raise RuntimeError(f"Could not fit {output_base} under {size_limit} bytes")
+
+
+def _part_files(output_base: str, extension: str):
+    directory = os.path.dirname(output_base) or "."
+    name = os.path.basename(output_base)
+    return sorted(
+        os.path.join(directory, f)
+        for f in os.listdir(directory)
+        if f.startswith(name) and f.endswith(extension)
+    )
+
+
+def _write_upload_list(output_base: str, paths):
+    with open(f"{output_base}_upload.json", "w", encoding="utf-8") as f:
+        json.dump({"files": paths}, f, indent=2)
+
+
+def upload_files(output_base: str):
+    """
+    The files the last export planned for upload, or the published file
+    when it wasn't exported with a size limit.
+    """
+    try:
+        with open(f"{output_base}_upload.json", "r", encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return [published_path(output_base)]
+
+
+def save_upload_limit(folder: str, size_limit: int):
+    """Record the publish channel's file size cap next to the ingest output."""
+    with open(os.path.join(folder, UPLOAD_LIMIT_FILE), "w", encoding="utf-8") as f:
+        json.dump({"filesize_limit": size_limit}, f, indent=2)
+
+
+def load_upload_limit(folder: str = None) -> int:
+    """The cap saved by the last ingest, or DEFAULT_UPLOAD_LIMIT if unknown."""
+    if not folder:
+        return DEFAULT_UPLOAD_LIMIT
+    try:
+        with open(os.path.join(folder, UPLOAD_LIMIT_FILE), "r", encoding="utf-8") as f:
+            return int(json.load(f)["filesize_limit"])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return DEFAULT_UPLOAD_LIMIT
@@ -6,9 +6,27 @@ Converts a text script with Speaker: Text format into an audio podcast
 
 import os
 import io
-import json
+import time
 from pydub import AudioSegment
 import requests
+from .export import (
+    DEFAULT_UPLOAD_LIMIT,
+    PODCAST_FORMATS,
+    export_podcast,
+    upload_files,
+)
+from .mixer import INTRO_FILE, MUSIC_BED_FILE, OUTRO_FILE, load_track, mix_episode
+from .script_schema import SnippetSegment, SpeechSegment, load_script, resolve_snippets
+from jobs.job_queue import get_queue
+from transcript.run_manifest import hash_value
+from run_stats import record, timed
+
+# EBU R128 integrated loudness target; unset keeps the old peak normalize()
+LOUDNESS_LUFS = (
+    float(os.getenv("PODCAST_LOUDNESS_LUFS"))
+    if os.getenv("PODCAST_LOUDNESS_LUFS")
+    else None
+)
 
 
 class SimplePodcastGenerator:
@@ -16,6 +34,14 @@ class SimplePodcastGenerator:
         self.api_key = elevenlabs_api_key
         self.api_url = "https://api.elevenlabs.io/v1"
         self.pause_duration = pause_duration  # milliseconds between speakers
+        # Reused across requests so long runs keep their HTTP connections warm
+        self.session = requests.Session()
+        self.tts_model_id = "eleven_multilingual_v2"
+        self.voice_settings = {"stability": 0.5, "similarity_boost": 0.5}
+        # Optional stingers and a music bed that ducks under speech
+        self.intro_file = INTRO_FILE
+        self.outro_file = OUTRO_FILE
+        self.music_bed_file = MUSIC_BED_FILE
         # Default voice IDs (these are ElevenLabs public voices)
         # You can replace these with your own voice IDs
         self.available_voices = [
@@ -27,56 +53,23 @@ class SimplePodcastGenerator:
         ]
 
     def load_json_script(self, json_file_path):
-        """Load segments from JSON file"""
-        if not os.path.exists(json_file_path):
-            raise FileNotFoundError(f"JSON file not found: {json_file_path}")
-
+        """Load and validate segments from JSON file"""
         try:
-            with open(json_file_path, "r", encoding="utf-8") as f:
-                segments = json.load(f)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON format in {json_file_path}: {e}")
-        except Exception as e:
+            segments = load_script(json_file_path)
+        except FileNotFoundError:
+            raise
+        except OSError as e:
             raise RuntimeError(f"Error reading JSON file {json_file_path}: {e}")
 
-        if not isinstance(segments, list):
-            raise ValueError("JSON file must contain an array of segments")
-
-        if not segments:
-            raise ValueError("JSON file contains no segments")
-
         print(f"📝 Loaded {len(segments)} segments from JSON")
-
-        # Validate and categorize segments
-        for i, segment in enumerate(segments):
-            if not isinstance(segment, dict):
-                raise ValueError(f"Segment {i} must be an object, got: {type(segment)}")
-
-            if "speaker" in segment and "text" in segment:
-                if not segment["speaker"].strip():
-                    raise ValueError(f"Segment {i}: Speaker name cannot be empty")
-                if not segment["text"].strip():
-                    raise ValueError(f"Segment {i}: Text cannot be empty")
-                segment["type"] = "speech"
-
-            elif "snippet" in segment:
-                if not segment["snippet"].strip():
-                    raise ValueError(f"Segment {i}: Snippet path cannot be empty")
-                segment["type"] = "audio_file"
-
-            else:
-                raise ValueError(
-                    f"Segment {i} must have either 'speaker'+'text' OR 'snippet' fields. Got: {list(segment.keys())}"
-                )
-
         return segments
 
     def assign_voices(self, segments):
         """Assign voices to speakers"""
-        unique_speakers = []
-        for seg in segments:
-            if "speaker" in seg and seg["speaker"] not in unique_speakers:
-                unique_speakers.append(seg["speaker"])
+        # dict keeps first-appearance order with O(1) membership checks
+        unique_speakers = dict.fromkeys(
+            seg.speaker for seg in segments if isinstance(seg, SpeechSegment)
+        )
 
         voice_mapping = {}
         for i, speaker in enumerate(unique_speakers):
@@ -86,8 +79,8 @@ class SimplePodcastGenerator:
 
         return voice_mapping
 
-    def text_to_speech(self, text, voice_id):
-        """Convert text to speech using ElevenLabs API"""
+    def fetch_speech(self, text, voice_id):
+        """Fetch the raw MP3 bytes for `text` from the ElevenLabs API"""
         if not self.api_key:
             raise ValueError(
                 "ElevenLabs API key is required for text-to-speech generation. Set ELEVENLABS_API_KEY environment variable."
@@ -103,29 +96,121 @@ class SimplePodcastGenerator:
 
         data = {
             "text": text,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
+            "model_id": self.tts_model_id,
+            "voice_settings": self.voice_settings,
         }
 
         try:
-            response = requests.post(url, json=data, headers=headers)
-            response.raise_for_status()
-
-            # Convert audio bytes to AudioSegment
-            audio_data = io.BytesIO(response.content)
-            return AudioSegment.from_file(audio_data, format="mp3")
+            with timed("tts", chars=len(text)) as stats:
+                response = self.session.post(url, json=data, headers=headers)
+                response.raise_for_status()
+                stats["bytes"] = len(response.content)
+            return response.content
 
         except requests.exceptions.RequestException as e:
             raise RuntimeError(
                 f"Failed to generate speech for text: '{text[:50]}...'. ElevenLabs API error: {e}"
             )
+
+    def text_to_speech(self, text, voice_id):
+        """Convert text to speech using ElevenLabs API"""
+        audio_bytes = self.fetch_speech(text, voice_id)
+        try:
+            # Convert audio bytes to AudioSegment
+            audio_data = io.BytesIO(audio_bytes)
+            return AudioSegment.from_file(audio_data, format="mp3")
+
         except Exception as e:
             raise RuntimeError(
                 f"Unexpected error during text-to-speech conversion: {e}"
             )
 
-    def generate_podcast(self, json_file_path, output_file="podcast_output.mp3"):
-        """Main function to generate podcast from JSON file"""
+    def synthesize_via_queue(self, queue, segments, voice_mapping, artifact_dir):
+        """
+        Queue one TTS job per speech line and wait for all of them, helping
+        out locally while waiting. Returns {segment index: mp3 path}.
+        """
+        from jobs.handlers import run_tts_jobs
+
+        lines = [
+            (i, segment.text, voice_mapping[segment.speaker])
+            for i, segment in enumerate(segments)
+            if isinstance(segment, SpeechSegment)
+        ]
+        paths = run_tts_jobs(queue, self, lines, artifact_dir)
+        return dict(zip((i for i, _, _ in lines), paths))
+
+    def speech_artifact_path(self, artifact_dir, index, text, voice_id):
+        """Artifact for script line `index`, named after what it was made from"""
+        key = hash_value(text, voice_id, self.tts_model_id, self.voice_settings)
+        return os.path.join(artifact_dir, f"{index:04d}_{key[:16]}.mp3")
+
+    def synthesize_segments(self, segments, voice_mapping, artifact_dir):
+        """
+        Make sure every speech line has an MP3 artifact, calling ElevenLabs
+        only for lines that are new, changed or failed last time. A failed
+        line doesn't stop the others; failures are raised together once
+        every other line is saved. Returns {segment index: mp3 path}.
+        """
+        os.makedirs(artifact_dir, exist_ok=True)
+        paths, failed = {}, []
+        fetched = 0
+        for i, segment in enumerate(segments):
+            if not isinstance(segment, SpeechSegment):
+                continue
+            voice_id = voice_mapping[segment.speaker]
+            path = self.speech_artifact_path(artifact_dir, i, segment.text, voice_id)
+            paths[i] = path
+            if os.path.exists(path):
+                continue
+
+            print(f"  🗣️  Synthesizing line {i + 1}: {segment.text[:50]}...")
+            try:
+                audio_bytes = self.fetch_speech(segment.text, voice_id)
+            except RuntimeError as e:
+                print(f"    ❌ {e}")
+                failed.append((i, e))
+                continue
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio_bytes)
+            os.replace(tmp_path, path)
+            fetched += 1
+
+        # Artifacts for lines that changed or no longer exist
+        current = {os.path.basename(p) for p in paths.values()}
+        for name in os.listdir(artifact_dir):
+            if name.endswith(".mp3") and name not in current:
+                os.remove(os.path.join(artifact_dir, name))
+
+        print(
+            f"🔊 {fetched} line(s) synthesized, "
+            f"{len(paths) - fetched - len(failed)} reused from {artifact_dir}"
+        )
+        if failed:
+            index, error = failed[0]
+            raise RuntimeError(
+                f"TTS failed for {len(failed)} of {len(paths)} line(s), first at "
+                f"segment {index + 1}: {error}. Finished lines are kept; re-run "
+                f"to synthesize only the rest."
+            )
+        return paths
+
+    def generate_podcast(
+        self,
+        json_file_path,
+        output_base="podcast_output",
+        formats=None,
+        loudness_lufs=LOUDNESS_LUFS,
+        size_limit=None,
+    ):
+        """
+        Main function to generate podcast from JSON file. Each format is
+        written to `output_base` plus its suffix (see export.EXPORT_FORMATS)
+        and the first format's path is returned. With `size_limit`,
+        the export also writes files that fit under it for uploading (see
+        export.export_podcast).
+        """
         print(f"🎙️  Generating podcast from: {json_file_path}")
 
         # Load segments from JSON
@@ -136,58 +221,99 @@ class SimplePodcastGenerator:
 
         print(f"📝 Found {len(segments)} segments")
 
+        # Check every snippet exists before paying for any TTS
+        snippet_files = resolve_snippets(
+            segments, os.path.dirname(os.path.abspath(json_file_path))
+        )
+
         # Assign voices to speakers
         voice_mapping = self.assign_voices(segments)
 
-        # Generate audio segments
-        audio_segments = []
-
-        print("🔊 Generating podcast...")
-        for i, segment in enumerate(segments, 1):
-            if segment.get("type") == "speech":
-                print(
-                    f"  [{i}/{len(segments)}] 🗣️  {segment['speaker']}: {segment['text'][:50]}..."
-                )
-
-                # Generate speech
-                speech_audio = self.text_to_speech(
-                    segment["text"], voice_mapping[segment["speaker"]]
-                )
-                audio_segments.append(speech_audio)
-
-            elif segment.get("type") == "audio_file":
-                print(
-                    f"  [{i}/{len(segments)}] 🎵 Loading audio file: {segment['snippet']}"
-                )
-
-                try:
-                    # Load the audio file
-                    audio_file = AudioSegment.from_file(segment["snippet"])
-                    audio_segments.append(audio_file)
+        started = time.perf_counter()
+        render_stats = {"speech_chars": 0, "speech_ms": 0, "snippet_ms": 0}
+
+        # Every line ends up as an MP3 on disk before anything is mixed, so
+        # a failed or interrupted render keeps what it already paid for
+        output_dir = os.path.dirname(os.path.abspath(output_base))
+        queue = get_queue()
+        if queue is not None:
+            # With a job queue, any worker can synthesize the lines
+            speech_files = self.synthesize_via_queue(
+                queue, segments, voice_mapping, os.path.join(output_dir, "tts_cache")
+            )
+        else:
+            speech_files = self.synthesize_segments(
+                segments, voice_mapping, os.path.join(output_dir, "tts_segments")
+            )
+        tts_seconds = time.perf_counter() - started
+
+        def load_clips():
+            # One clip decoded at a time; the mixer copies it into the timeline
+            for i, segment in enumerate(segments, 1):
+                if isinstance(segment, SpeechSegment):
+                    print(
+                        f"  [{i}/{len(segments)}] 🗣️  {segment.speaker}: {segment.text[:50]}..."
+                    )
+                    speech_audio = AudioSegment.from_file(
+                        speech_files[i - 1], format="mp3"
+                    )
+                    render_stats["speech_chars"] += len(segment.text)
+                    render_stats["speech_ms"] += len(speech_audio)
+                    yield speech_audio
+
+                elif isinstance(segment, SnippetSegment):
+                    print(
+                        f"  [{i}/{len(segments)}] 🎵 Loading audio file: {segment.snippet}"
+                    )
+
+                    try:
+                        # Load the audio file
+                        audio_file = AudioSegment.from_file(
+                            snippet_files[segment.snippet]
+                        )
+                    except Exception as e:
+                        print(f"    ❌ Error loading {segment.snippet}: {e}")
+                        # Add silence as fallback
+                        yield AudioSegment.silent(duration=2000)
+                        continue
+                    render_stats["snippet_ms"] += len(audio_file)
                     print(f"    ✅ Added {len(audio_file)/1000:.1f}s audio clip")
-                except Exception as e:
-                    print(f"    ❌ Error loading {segment['snippet']}: {e}")
-                    # Add silence as fallback
-                    audio_segments.append(AudioSegment.silent(duration=2000))
-
-            # Add pause between segments (except the last one)
-            if i < len(segments):
-                pause = AudioSegment.silent(duration=self.pause_duration)
-                audio_segments.append(pause)
-
-        # Combine all segments
-        print("🎵 Combining audio segments...")
-        if audio_segments:
-            final_podcast = sum(audio_segments)
-
-            # Normalize audio levels
-            final_podcast = final_podcast.normalize()
-
-            # Export
-            print(f"💾 Exporting to: {output_file}")
-            final_podcast.export(output_file, format="mp3", bitrate="192k")
+                    yield audio_file
+
+        # Lay everything out on one timeline, with pauses between segments
+        print("🎵 Mixing audio segments...")
+        final_podcast = mix_episode(
+            load_clips(),
+            self.pause_duration,
+            intro=load_track(self.intro_file),
+            outro=load_track(self.outro_file),
+            bed=load_track(self.music_bed_file),
+        )
+        if final_podcast is not None:
+            # Normalize audio levels (loudnorm runs inside the encoders instead)
+            if loudness_lufs is None:
+                final_podcast = final_podcast.normalize()
+
+            # Export every format in one pass over the PCM
+            formats = formats or PODCAST_FORMATS
+            print(f"💾 Exporting {', '.join(formats)} to: {output_base}.*")
+            results = export_podcast(
+                final_podcast, output_base, formats, loudness_lufs, size_limit
+            )
+            output_file = results[formats[0]]["path"]
 
             duration = len(final_podcast) / 1000  # Convert to seconds
+            record(
+                "render",
+                seconds=round(time.perf_counter() - started, 3),
+                segments=len(segments),
+                episode_seconds=duration,
+                speech_chars=render_stats["speech_chars"],
+                speech_seconds=render_stats["speech_ms"] / 1000,
+                snippet_seconds=render_stats["snippet_ms"] / 1000,
+                tts_seconds=round(tts_seconds, 3),
+                pause_ms=self.pause_duration,
+            )
             print("✅ Podcast generated successfully!")
             print(f"   Duration: {duration:.1f} seconds ({duration/60:.1f} minutes)")
             print(f"   File: {output_file}")
@@ -198,29 +324,37 @@ class SimplePodcastGenerator:
             return None
 
 
-def generate_podcast_from_data():
-    input_file = "data/transcript.json"
-    output_file = "data/podcast.mp3"
+def generate_podcast_from_data(
+    generator=None, data_dir="data", size_limit=DEFAULT_UPLOAD_LIMIT
+):
+    """
+    Render data_dir/transcript.json; returns the files to upload, each under
+    `size_limit` bytes, or None.
+    """
+    input_file = os.path.join(data_dir, "transcript.json")
+    output_base = os.path.join(data_dir, "podcast")
 
-    api_key = os.getenv("ELEVENLABS_API_KEY")
-    if not api_key:
-        print("⚠️  No ELEVENLABS_API_KEY found in config.")
-        raise EnvironmentError("ELEVENLABS_API_KEY is required.")
+    if generator is None:
+        api_key = os.getenv("ELEVENLABS_API_KEY")
+        if not api_key:
+            print("⚠️  No ELEVENLABS_API_KEY found in config.")
+            raise EnvironmentError("ELEVENLABS_API_KEY is required.")
 
-    pause_ms = 200
-    generator = SimplePodcastGenerator(api_key, pause_duration=pause_ms)
-    result = generator.generate_podcast(input_file, output_file)
+        pause_ms = 200
+        generator = SimplePodcastGenerator(api_key, pause_duration=pause_ms)
+    result = generator.generate_podcast(input_file, output_base, size_limit=size_limit)
 
     if result:
         print(f"\n🎉 Success! Your podcast is ready: {result}")
     else:
         print("\n❌ Failed to generate podcast")
-    return output_file
+        return None
+    return upload_files(output_base)
 
 
 def main():
     input_file = "data/transcript.json"
-    output_file = "data/podcast_today.mp3"
+    output_base = "data/podcast_today"
 
     api_key = os.getenv("ELEVENLABS_API_KEY")
     if not api_key:
@@ -230,13 +364,13 @@ def main():
     # Create generator and process - you can adjust pause duration here
     pause_ms = 800  # Change this value to adjust pauses (in milliseconds)
     generator = SimplePodcastGenerator(api_key, pause_duration=pause_ms)
-    result = generator.generate_podcast(input_file, output_file)
+    result = generator.generate_podcast(input_file, output_base)
 
     if result:
         print(f"\n🎉 Success! Your podcast is ready: {result}")
     else:
         print("\n❌ Failed to generate podcast")
-    return output_file
+    return result
 
 
 if __name__ == "__main__":
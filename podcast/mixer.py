@@ -0,0 +1,188 @@
+"""
+Podcast Mixer
+Renders the episode into one NumPy timeline: the voice clips in order
+with pauses between them, an optional intro/outro stinger and an optional
+music bed that ducks under speech.
+
+Each clip is converted once and added into a single buffer that grows
+geometrically, and the ducking envelope is computed on 10 ms frames, so
+mixing stays linear in episode length (pydub's `+`/`overlay` copy the
+whole track per call).
+"""
+
+import os
+import math
+from typing import TYPE_CHECKING, Iterable, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+MIX_SAMPLE_RATE = 44100
+MIX_CHANNELS = 2
+
+INTRO_FILE = os.getenv("PODCAST_INTRO")
+OUTRO_FILE = os.getenv("PODCAST_OUTRO")
+MUSIC_BED_FILE = os.getenv("PODCAST_MUSIC_BED")
+MUSIC_BED_DB = float(os.getenv("PODCAST_MUSIC_BED_DB") or -18)
+# Extra attenuation of the bed while someone is talking
+DUCK_DB = float(os.getenv("PODCAST_DUCK_DB") or -12)
+
+DUCK_FRAME_MS = 10
+DUCK_THRESHOLD_DB = -45.0  # voice frames louder than this duck the bed
+DUCK_HOLD_MS = 300  # keep ducking through short gaps between words
+DUCK_RAMP_MS = 80
+BED_FADE_MS = 1500
+
+
+def to_array(segment: "AudioSegment") -> np.ndarray:
+    """(samples, channels) float32 at the mix rate and layout."""
+    segment = (
+        segment.set_frame_rate(MIX_SAMPLE_RATE)
+        .set_channels(MIX_CHANNELS)
+        .set_sample_width(2)
+    )
+    samples = np.frombuffer(segment.raw_data, dtype=np.int16)
+    return samples.reshape(-1, MIX_CHANNELS).astype(np.float32) / 32768.0
+
+
+def load_track(path: Optional[str]) -> Optional[np.ndarray]:
+    if not path:
+        return None
+    from pydub import AudioSegment
+
+    return to_array(AudioSegment.from_file(path))
+
+
+def _frames_to_samples(frame_gain: np.ndarray, frame: int, length: int):
+    """Linearly interpolate per-frame gains to per-sample gains (float32)."""
+    frame_gain = frame_gain.astype(np.float32)
+    if len(frame_gain) < 2:
+        return np.full(length, frame_gain[0] if len(frame_gain) else 1.0, np.float32)
+    ramp = np.arange(frame, dtype=np.float32) / frame
+    steps = np.diff(frame_gain)
+    gain = (frame_gain[:-1, None] + steps[:, None] * ramp).reshape(-1)
+    if len(gain) < length:
+        gain = np.concatenate(
+            [gain, np.full(length - len(gain), frame_gain[-1], np.float32)]
+        )
+    return gain[:length]
+
+
+def duck_envelope(voice: np.ndarray) -> np.ndarray:
+    """Per-sample bed gain: DUCK_DB wherever `voice` is active, else 0 dB."""
+    frame = MIX_SAMPLE_RATE * DUCK_FRAME_MS // 1000
+    count = len(voice) // frame
+    if count == 0:
+        return np.ones(len(voice), np.float32)
+
+    frames = voice[: count * frame].reshape(count, frame, -1)
+    rms = np.sqrt(np.mean(np.square(frames), axis=(1, 2)))
+    active = 20 * np.log10(np.maximum(rms, 1e-10)) > DUCK_THRESHOLD_DB
+
+    hold = DUCK_HOLD_MS // DUCK_FRAME_MS
+    active = np.convolve(active, np.ones(2 * hold + 1), mode="same") > 0
+    frame_gain = np.where(active, 10 ** (DUCK_DB / 20), 1.0)
+    ramp = max(1, DUCK_RAMP_MS // DUCK_FRAME_MS)
+    # Edge-pad so the moving average doesn't pull the ends toward zero
+    padded = np.pad(frame_gain, ramp, mode="edge")
+    frame_gain = np.convolve(padded, np.ones(ramp) / ramp, mode="same")[ramp:-ramp]
+    return _frames_to_samples(frame_gain, frame, len(voice))
+
+
+def _loop(track: np.ndarray, length: int) -> np.ndarray:
+    repeats = math.ceil(length / len(track))
+    return np.tile(track, (repeats, 1))[:length]
+
+
+def _fade(length: int, fade: int) -> np.ndarray:
+    envelope = np.ones(length, np.float32)
+    fade = min(fade, length // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        envelope[:fade] = ramp
+        envelope[-fade:] = ramp[::-1]
+    return envelope
+
+
+class _Timeline:
+    """Float32 mix buffer that grows geometrically as clips are placed."""
+
+    def __init__(self, capacity: int = MIX_SAMPLE_RATE * 60):
+        self.buffer = np.zeros((capacity, MIX_CHANNELS), np.float32)
+        self.length = 0
+
+    def add(self, offset: int, array: np.ndarray):
+        end = offset + len(array)
+        if end > len(self.buffer):
+            grown = np.zeros((max(end, 2 * len(self.buffer)), MIX_CHANNELS), np.float32)
+            grown[: self.length] = self.buffer[: self.length]
+            self.buffer = grown
+        self.buffer[offset:end] += array
+        self.length = max(self.length, end)
+
+    def extend(self, length: int):
+        self.add(length, np.empty((0, MIX_CHANNELS), np.float32))
+
+    @property
+    def mix(self) -> np.ndarray:
+        return self.buffer[: self.length]
+
+
+def mix_episode(
+    clips: Iterable["AudioSegment"],
+    pause_ms: int,
+    intro: Optional[np.ndarray] = None,
+    outro: Optional[np.ndarray] = None,
+    bed: Optional[np.ndarray] = None,
+) -> Optional["AudioSegment"]:
+    """
+    Lay out intro, clips (separated by `pause_ms`) and outro on one
+    timeline, add the ducked music bed under the clips and return the mix,
+    or None when there were no clips. `clips` is consumed lazily, so only
+    one of them needs to be decoded at a time.
+    """
+    from pydub import AudioSegment
+
+    pause = MIX_SAMPLE_RATE * pause_ms // 1000
+    timeline = _Timeline()
+
+    position = 0
+    if intro is not None:
+        timeline.add(0, intro)
+        position = len(intro) + pause
+    voice_start = position
+    placed = 0
+    for clip in clips:
+        if placed:
+            position += pause
+        array = to_array(clip)
+        timeline.add(position, array)
+        position += len(array)
+        placed += 1
+    if not placed:
+        return None
+    voice_end = position
+    timeline.extend(voice_end)
+
+    if bed is not None and len(bed) and voice_end > voice_start:
+        region = timeline.mix[voice_start:voice_end]
+        gain = duck_envelope(region)
+        gain *= _fade(len(region), MIX_SAMPLE_RATE * BED_FADE_MS // 1000)
+        gain *= np.float32(10 ** (MUSIC_BED_DB / 20))
+        region += _loop(bed, len(region)) * gain[:, None]
+
+    if outro is not None:
+        timeline.add(voice_end + pause, outro)
+
+    mix = timeline.mix
+    peak = np.abs(mix).max() if len(mix) else 0.0
+    if peak > 1.0:
+        mix /= peak
+    pcm = (mix * 32767).astype(np.int16)
+    return AudioSegment(
+        pcm.tobytes(),
+        sample_width=2,
+        frame_rate=MIX_SAMPLE_RATE,
+        channels=MIX_CHANNELS,
+    )
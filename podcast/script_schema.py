@@ -0,0 +1,130 @@
+"""
+Podcast script schema
+The transcript.json format shared by generate_script (which writes it) and
+SimplePodcastGenerator (which renders it): a JSON array where each segment
+is either {"speaker", "text"} or {"snippet"}.
+"""
+
+import os
+from typing import Dict, List, Union
+from typing_extensions import Annotated
+from pydantic import (
+    Discriminator,
+    StringConstraints,
+    Tag,
+    TypeAdapter,
+    ValidationError,
+)
+from pydantic.dataclasses import dataclass
+
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
+@dataclass(frozen=True)
+class SpeechSegment:
+    __slots__ = ("speaker", "text")
+    speaker: NonEmptyStr
+    text: NonEmptyStr
+
+
+@dataclass(frozen=True)
+class SnippetSegment:
+    __slots__ = ("snippet",)
+    snippet: NonEmptyStr
+
+
+def _segment_kind(value):
+    # The model writes no "type" field, so the keys present pick the variant
+    if isinstance(value, dict):
+        if "snippet" in value:
+            return "snippet"
+        if "speaker" in value or "text" in value:
+            return "speech"
+        return None
+    if isinstance(value, SnippetSegment):
+        return "snippet"
+    if isinstance(value, SpeechSegment):
+        return "speech"
+    return None
+
+
+Segment = Annotated[
+    Union[
+        Annotated[SpeechSegment, Tag("speech")],
+        Annotated[SnippetSegment, Tag("snippet")],
+    ],
+    Discriminator(
+        _segment_kind,
+        custom_error_type="invalid_segment",
+        custom_error_message="Segment must have either 'speaker'+'text' OR 'snippet' fields",
+    ),
+]
+
+# Built once at import; validation runs in pydantic-core without Python loops
+_script_adapter = TypeAdapter(List[Segment])
+
+
+def parse_script(data: Union[str, bytes, list]) -> List[Segment]:
+    """Validate raw JSON (or already-parsed data) into segment objects."""
+    try:
+        if isinstance(data, (str, bytes)):
+            segments = _script_adapter.validate_json(data)
+        else:
+            segments = _script_adapter.validate_python(data)
+    except ValidationError as e:
+        raise ValueError(f"Invalid podcast script: {e}")
+
+    if not segments:
+        raise ValueError("Podcast script contains no segments")
+    return segments
+
+
+def load_script(path: str) -> List[Segment]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"JSON file not found: {path}")
+    with open(path, "rb") as f:
+        return parse_script(f.read())
+
+
+def save_script(segments: List[Segment], path: str):
+    with open(path, "wb") as f:
+        f.write(_script_adapter.dump_json(segments, indent=2))
+
+
+def resolve_snippets(segments: List[Segment], base_dir: str = None) -> Dict[str, str]:
+    """
+    Map every snippet path in the script to a file that exists, trying it
+    as given (relative to the working directory) and then relative to
+    `base_dir`. Each directory is listed once, so a long script costs one
+    scandir per snippet folder rather than a stat per segment. Raises
+    FileNotFoundError naming every missing snippet.
+    """
+    snippets = {s.snippet for s in segments if isinstance(s, SnippetSegment)}
+    listings = {}
+
+    def exists(path):
+        directory, name = os.path.split(os.path.abspath(path))
+        if directory not in listings:
+            try:
+                with os.scandir(directory) as entries:
+                    listings[directory] = {e.name for e in entries if e.is_file()}
+            except OSError:
+                listings[directory] = set()
+        return name in listings[directory]
+
+    resolved, missing = {}, []
+    for snippet in sorted(snippets):
+        candidates = [snippet]
+        if base_dir and not os.path.isabs(snippet):
+            candidates.append(os.path.join(base_dir, snippet))
+        found = next((c for c in candidates if exists(c)), None)
+        if found is None:
+            missing.append(snippet)
+        else:
+            resolved[snippet] = found
+
+    if missing:
+        raise FileNotFoundError(
+            f"{len(missing)} snippet file(s) in the script do not exist: {missing}"
+        )
+    return resolved
@@ -0,0 +1,89 @@
+"""
+Run statistics
+Every expensive step (Whisper, LLM calls, TTS, the final render) appends
+one JSON line here with how much work it did and how long it took. The
+`plan` command reads these back to calibrate its estimates.
+"""
+
+import os
+import json
+import time
+import fcntl
+import statistics
+from contextlib import contextmanager
+from datetime import datetime
+
+RUN_STATS_FILE = os.getenv("RUN_STATS_FILE") or "data/run_stats.jsonl"
+# Only the most recent records count, so estimates follow hardware/model changes
+CALIBRATION_WINDOW = 50
+
+
+def record(stage: str, path: str = None, **fields):
+    """Append one measurement for `stage`. Never fails the calling stage."""
+    path = path or RUN_STATS_FILE
+    entry = {
+        "stage": stage,
+        "at": datetime.now().isoformat(timespec="seconds"),
+        **fields,
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            # Worker processes may share the file
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Could not record run stats to {path}: {e}")
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    """Record `stage` with its wall time; add more fields to the yielded dict."""
+    started = time.perf_counter()
+    yield fields
+    record(stage, seconds=round(time.perf_counter() - started, 3), **fields)
+
+
+def load(path: str = None) -> dict:
+    """Past records grouped by stage, oldest first."""
+    path = path or RUN_STATS_FILE
+    stages = {}
+    if not os.path.exists(path):
+        return stages
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-append leaves at most one bad line
+                continue
+            stages.setdefault(entry.get("stage"), []).append(entry)
+    return stages
+
+
+def median_ratio(records: list, numerator: str, denominator: str, default: float):
+    """Median of numerator/denominator over recent records, or `default`."""
+    ratios = [
+        r[numerator] / r[denominator]
+        for r in records[-CALIBRATION_WINDOW:]
+        if r.get(numerator) is not None and r.get(denominator)
+    ]
+    return statistics.median(ratios) if ratios else default
+
+
+def median_value(records: list, field: str, default: float):
+    values = [
+        r[field] for r in records[-CALIBRATION_WINDOW:] if r.get(field) is not None
+    ]
+    return statistics.median(values) if values else default
+
+
+def usage_fields(response) -> dict:
+    """Token counts from an OpenAI-style chat completion, when reported."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+    }
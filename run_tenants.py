@@ -0,0 +1,205 @@
+"""
+Multi-tenant runner
+Produces an episode for every tenant in tenants.json from one process:
+one Discord login, one Whisper model, one OpenRouter client and one HTTP
+pool are shared, and a fair scheduler interleaves the tenants' work so a
+chatty group can't starve the rest.
+"""
+
+import os
+import asyncio
+from collections import defaultdict, deque
+
+import aiohttp
+
+from config import config
+from tenants import load_tenants
+from discord.discord_filtered_read import get_discord_client, process_discord_messages
+from discord.discord_write_attachment import PODCAST_MESSAGE, send_podcast_file
+from transcript.create_snippets import AudioSnippetExtractor
+from transcript.generate_transcript import (
+    ScriptPaths,
+    get_metadata,
+    process_speaker,
+    transcript_key,
+    write_script,
+)
+from transcript.run_manifest import RunManifest
+from podcast.generate_podcast import SimplePodcastGenerator, generate_podcast_from_data
+
+# Jobs (speaker processing, renders) running at once across all tenants
+RUNNER_WORKERS = int(os.getenv("RUNNER_WORKERS") or 2)
+
+
+class FairScheduler:
+    """
+    Round-robin job scheduler: at most `workers` jobs run at once, each
+    tenant gets at most its quota of them, and free slots go to the next
+    tenant in rotation that has work queued.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.running = 0
+        self.queues = defaultdict(deque)
+        self.in_flight = defaultdict(int)
+        self.quotas = {}
+        self.rotation = deque()
+        self.tasks = set()
+
+    def submit(self, tenant: str, quota: int, job_factory):
+        """Queue `job_factory()` (a coroutine factory); returns a future."""
+        future = asyncio.get_running_loop().create_future()
+        self.quotas[tenant] = max(1, quota)
+        self.queues[tenant].append((job_factory, future))
+        if tenant not in self.rotation:
+            self.rotation.append(tenant)
+        self._dispatch()
+        return future
+
+    def _next_job(self):
+        for _ in range(len(self.rotation)):
+            tenant = self.rotation[0]
+            self.rotation.rotate(-1)
+            queue = self.queues[tenant]
+            if queue and self.in_flight[tenant] < self.quotas[tenant]:
+                return tenant, *queue.popleft()
+        return None
+
+    def _dispatch(self):
+        while self.running < self.workers:
+            job = self._next_job()
+            if job is None:
+                return
+            tenant, job_factory, future = job
+            self.running += 1
+            self.in_flight[tenant] += 1
+            task = asyncio.create_task(self._run(tenant, job_factory, future))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, tenant, job_factory, future):
+        try:
+            future.set_result(await job_factory())
+        except SystemExit as e:
+            # Pipeline stages sys.exit() on fatal errors; fail just this tenant
+            future.set_exception(RuntimeError(f"stage exited with status {e.code}"))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            self.running -= 1
+            self.in_flight[tenant] -= 1
+            self._dispatch()
+
+
+class MultiTenantRunner:
+    def __init__(self, tenants):
+        self.tenants = tenants
+        self.client = get_discord_client()
+        self.extractor = AudioSnippetExtractor(os.getenv("OPENROUTER_API_KEY"))
+        self.generator = SimplePodcastGenerator(
+            os.getenv("ELEVENLABS_API_KEY"), pause_duration=200
+        )
+        self.scheduler = FairScheduler(RUNNER_WORKERS)
+        self.results = {}
+        self.started = False
+        self.client.event(self.on_ready)
+
+    async def run_tenant(self, tenant, session):
+        paths = ScriptPaths(tenant.download_folder, tenant.data_dir)
+        quota = tenant.max_concurrency
+
+        print(f"📥 [{tenant.name}] Reading voice messages...")
+        if not await process_discord_messages(self.client, session, tenant=tenant):
+            raise RuntimeError("Failed to get messages")
+
+        metadata = get_metadata(paths.metadata_file)
+        if not metadata:
+            raise RuntimeError(f"No speakers found in {paths.metadata_file}")
+
+        # Each speaker is its own job, so tenants interleave speaker by speaker
+        manifest = RunManifest(paths.run_manifest_file)
+        texts = await asyncio.gather(
+            *(
+                self.scheduler.submit(
+                    tenant.name,
+                    quota,
+                    lambda person=person: process_speaker(
+                        person, self.extractor, manifest, paths
+                    ),
+                )
+                for person in metadata
+            )
+        )
+        transcripts = {
+            transcript_key(person): text for person, text in zip(metadata, texts)
+        }
+
+        print(f"✍️  [{tenant.name}] Writing script...")
+        await self.scheduler.submit(
+            tenant.name,
+            quota,
+            lambda: write_script(transcripts, self.extractor, paths),
+        )
+
+        channel = self.client.get_channel(tenant.send_channel_id)
+        if not channel:
+            raise RuntimeError(
+                f"Could not find channel with ID {tenant.send_channel_id}"
+            )
+
+        print(f"🎙️  [{tenant.name}] Rendering podcast...")
+        podcast_files = await self.scheduler.submit(
+            tenant.name,
+            quota,
+            lambda: asyncio.to_thread(
+                generate_podcast_from_data,
+                self.generator,
+                paths.data_dir,
+                channel.guild.filesize_limit,
+            ),
+        )
+        if not podcast_files:
+            raise RuntimeError("Failed to render podcast")
+
+        if not await send_podcast_file(channel, PODCAST_MESSAGE, podcast_files):
+            raise RuntimeError("Failed to publish podcast")
+
+    async def run_all(self):
+        async with aiohttp.ClientSession() as session:
+            outcomes = await asyncio.gather(
+                *(self.run_tenant(tenant, session) for tenant in self.tenants),
+                return_exceptions=True,
+            )
+        for tenant, outcome in zip(self.tenants, outcomes):
+            self.results[tenant.name] = outcome is None
+            if outcome is None:
+                print(f"✅ [{tenant.name}] Episode published")
+            else:
+                print(f"❌ [{tenant.name}] Episode failed: {outcome}")
+
+    async def on_ready(self):
+        print(f"Logged in as {self.client.user} (ID: {self.client.user.id})")
+        # on_ready fires again after reconnects; only run the batch once
+        if self.started:
+            return
+        self.started = True
+        try:
+            await self.run_all()
+        finally:
+            await self.client.close()
+
+    def run(self):
+        print(
+            f"Running {len(self.tenants)} tenant(s): {[t.name for t in self.tenants]}"
+        )
+        self.client.run(config.DISCORD_TOKEN)
+        return all(self.results.get(t.name) for t in self.tenants)
+
+
+def main():
+    return MultiTenantRunner(load_tenants()).run()
+
+
+if __name__ == "__main__":
+    main()
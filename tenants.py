@@ -0,0 +1,76 @@
+import os
+import json
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from config import config
+
+TENANTS_FILE = os.getenv("TENANTS_FILE") or "tenants.json"
+
+# Discord username -> name used in the podcast, for the single-tenant setup
+DEFAULT_USER_MAP = {
+    "lennyhuang": "Len",
+    "pushinppalways": "Fee",
+    "rajmehta23": "Raj",
+    "browncrown": "Raj",
+}
+DEFAULT_FALLBACK_NAME = "Sam"
+
+
+class Tenant(BaseModel):
+    """One friend group: where to read voice messages and where to post."""
+
+    name: str
+    server_id: Optional[int] = None
+    upload_channel_id: int
+    send_channel_id: int
+    user_map: Dict[str, str] = {}
+    fallback_name: str = DEFAULT_FALLBACK_NAME
+    # Max jobs (speakers being processed, renders) this tenant may have in
+    # flight at once when sharing a runner with other tenants
+    max_concurrency: int = 1
+    download_folder: Optional[str] = None
+    data_dir: Optional[str] = None
+
+    def display_name(self, username: str) -> str:
+        return self.user_map.get(username, self.fallback_name)
+
+
+class TenantsFile(BaseModel):
+    tenants: List[Tenant]
+
+
+def default_tenant() -> Tenant:
+    """The single group configured through .env, using the original paths."""
+    return Tenant(
+        name="default",
+        server_id=config.SERVER_ID,
+        upload_channel_id=config.UPLOAD_CHANNEL_ID or 0,
+        send_channel_id=config.SEND_CHANNEL_ID or 0,
+        user_map=DEFAULT_USER_MAP,
+        download_folder=config.DOWNLOAD_FOLDER,
+        data_dir="./data",
+    )
+
+
+def load_tenants(path: str = TENANTS_FILE) -> List[Tenant]:
+    """
+    Load every tenant from the tenants file, giving each one its own
+    download folder and data dir unless they are set explicitly. Falls back
+    to the single .env tenant when there is no tenants file.
+    """
+    if not os.path.exists(path):
+        return [default_tenant()]
+
+    with open(path, "r", encoding="utf-8") as f:
+        tenants = TenantsFile(**json.load(f)).tenants
+
+    names = [t.name for t in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Tenant names must be unique in {path}: {names}")
+
+    for tenant in tenants:
+        if tenant.download_folder is None:
+            tenant.download_folder = os.path.join(config.DOWNLOAD_FOLDER, tenant.name)
+        if tenant.data_dir is None:
+            tenant.data_dir = os.path.join("data", tenant.name)
+    return tenants
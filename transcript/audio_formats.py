@@ -0,0 +1,141 @@
+"""
+Combined Audio Formats
+Read/write helpers for the per-speaker combined audio. Whisper
+only needs 16 kHz mono, so the combined stage can store exactly that
+instead of full-rate stereo WAV.
+"""
+
+import os
+import wave
+import subprocess
+from typing import TYPE_CHECKING
+import numpy as np
+
+# whisper and pydub are imported inside the functions that need them
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+WHISPER_SAMPLE_RATE = 16000
+
+# format name -> file extension
+COMBINED_FORMATS = {
+    "wav": ".wav",  # full-rate WAV as decoded from the source files
+    "pcm16k": ".wav",  # 16 kHz mono 16-bit PCM WAV
+    "flac": ".flac",  # lossless, full rate
+    "npy": ".npy",  # 16 kHz mono float32, memory-mapped straight into Whisper
+}
+
+
+def combined_path(directory: str, name: str, format: str) -> str:
+    if format not in COMBINED_FORMATS:
+        raise ValueError(
+            f"Unknown combined format '{format}', expected one of {list(COMBINED_FORMATS)}"
+        )
+    return os.path.join(directory, f"{name}{COMBINED_FORMATS[format]}")
+
+
+def _to_whisper_pcm(segment: "AudioSegment") -> "AudioSegment":
+    return (
+        segment.set_frame_rate(WHISPER_SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    )
+
+
+def export_combined(segment: "AudioSegment", path: str, format: str):
+    """Write a combined AudioSegment in the requested intermediate format."""
+    if format == "wav":
+        segment.export(path, format="wav")
+    elif format == "pcm16k":
+        _to_whisper_pcm(segment).export(path, format="wav")
+    elif format == "flac":
+        segment.export(path, format="flac")
+    elif format == "npy":
+        samples = np.frombuffer(_to_whisper_pcm(segment).raw_data, dtype=np.int16)
+        # np.save on an open handle keeps the exact path (no extra .npy suffix)
+        with open(path, "wb") as f:
+            np.save(f, samples.astype(np.float32) / 32768.0)
+    else:
+        raise ValueError(f"Unknown combined format '{format}'")
+
+
+def _read_pcm16k_wav(path: str):
+    """Return the samples of a 16 kHz mono s16 WAV, or None for anything else."""
+    with wave.open(path, "rb") as wav:
+        if (
+            wav.getframerate() != WHISPER_SAMPLE_RATE
+            or wav.getnchannels() != 1
+            or wav.getsampwidth() != 2
+        ):
+            return None
+        frames = wav.readframes(wav.getnframes())
+    return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def load_whisper_audio(path: str) -> np.ndarray:
+    """
+    Load audio as the 16 kHz mono float32 buffer Whisper expects, skipping
+    the ffmpeg decode whenever the file is already in that shape.
+    """
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if path.endswith(".wav"):
+        try:
+            samples = _read_pcm16k_wav(path)
+        except wave.Error:
+            samples = None
+        if samples is not None:
+            return samples
+
+    import whisper
+
+    return whisper.load_audio(path)
+
+
+def load_audio_segment(path: str) -> "AudioSegment":
+    """Load any combined file (including .npy) as an AudioSegment."""
+    from pydub import AudioSegment
+
+    if path.endswith(".npy"):
+        samples = np.load(path, mmap_mode="r")
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        return AudioSegment(
+            pcm.tobytes(),
+            sample_width=2,
+            frame_rate=WHISPER_SAMPLE_RATE,
+            channels=1,
+        )
+    return AudioSegment.from_file(path)
+
+
+def probe_duration(path: str):
+    """
+    Duration in seconds read from the container header (no decode), or
+    None when it can't be determined.
+    """
+    if path.endswith(".npy"):
+        return len(np.load(path, mmap_mode="r")) / WHISPER_SAMPLE_RATE
+    if path.endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            pass  # e.g. WAVE_FORMAT_EXTENSIBLE; let ffprobe handle it
+
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
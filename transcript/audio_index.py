@@ -0,0 +1,94 @@
+import os
+import json
+import fcntl
+from .run_manifest import hash_file
+
+
+class AudioIndex:
+    """
+    Content-hash index of the downloaded voice messages, kept next to them
+    as audio_index.json.
+
+    Each file's sha256 is cached against its size and mtime, so files are
+    only hashed once, and every distinct audio payload has one canonical
+    file. A reposted voice note, or the same file listed under two
+    speakers, maps to the same payload and is only processed once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.data = self._load()
+        self.dirty = False
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        data.setdefault("files", {})
+        data.setdefault("payloads", {})
+        return data
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def hash(self, path: str) -> str:
+        """sha256 of the file, reusing the cached one while it is unchanged."""
+        stat = os.stat(path)
+        key = self._key(path)
+        entry = self.data["files"].get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["sha256"]
+        digest = hash_file(path)
+        self.data["files"][key] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": digest,
+        }
+        self.dirty = True
+        return digest
+
+    def canonical(self, path: str) -> str:
+        """
+        Path of the first file seen with this file's content, or `path`
+        itself (now registered) when the content is new.
+        """
+        digest = self.hash(path)
+        existing = self.data["payloads"].get(digest)
+        if existing and existing != self._key(path):
+            existing_path = os.path.join(self.root, existing)
+            if os.path.exists(existing_path):
+                return existing_path
+        if existing != self._key(path):
+            self.data["payloads"][digest] = self._key(path)
+            self.dirty = True
+        return path
+
+    def save(self):
+        """Merge into whatever other processes wrote and persist atomically."""
+        if not self.dirty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                on_disk = self._load()
+                on_disk["files"].update(self.data["files"])
+                # The first file registered for a payload stays canonical
+                # for as long as it exists
+                for digest, key in self.data["payloads"].items():
+                    current = on_disk["payloads"].get(digest)
+                    if current is None or not os.path.exists(
+                        os.path.join(self.root, current)
+                    ):
+                        on_disk["payloads"][digest] = key
+                self.data = on_disk
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.dirty = False
@@ -6,32 +6,74 @@ Simple Audio Snippet Extractor
 3. Extract those parts as audio snippets
 """
 
-import whisper
 import json
-from pydub import AudioSegment
-from openai import AsyncOpenAI
 import os
 import re
 import asyncio
+import threading
+from .highlight_scorer import select_highlights
+from .snippet_boundaries import refine_boundaries
+from .audio_formats import (
+    WHISPER_SAMPLE_RATE,
+    load_audio_segment,
+    load_whisper_audio,
+)
+from run_stats import timed, usage_fields
+
+# "llm" asks OpenRouter, "local" uses the heuristic scorer only and
+# "hybrid" uses the scorer as a pre-filter before asking the LLM
+HIGHLIGHT_MODES = ("llm", "local", "hybrid")
+HYBRID_CANDIDATES = 6
 
 
 class AudioSnippetExtractor:
-    def __init__(self, router_api_key=None):
-        print("Loading Whisper model...")
-        self.whisper_model = whisper.load_model("base")
+    def __init__(self, router_api_key=None, highlight_mode=None):
+        self.highlight_mode = highlight_mode or os.getenv("HIGHLIGHT_MODE") or "llm"
+        if self.highlight_mode not in HIGHLIGHT_MODES:
+            raise ValueError(
+                f"Unknown highlight mode '{self.highlight_mode}', expected one of {HIGHLIGHT_MODES}"
+            )
+        self._whisper_model = None
+        # One model is shared by every caller thread; Whisper isn't thread-safe
+        self._whisper_lock = threading.Lock()
+        from openai import AsyncOpenAI
+
         self.openrouter_client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=router_api_key,
         )
         self.model = os.getenv("OPENROUTER_MODEL")
 
-    def transcribe_with_timestamps(self, audio_file):
-        """Step 1: Get transcript with word-level timestamps"""
-        print(f"Transcribing: {audio_file}")
+    @property
+    def whisper_model(self):
+        # Loaded on first use so resumed runs can skip it entirely
+        with self._whisper_lock:
+            if self._whisper_model is None:
+                import whisper
 
-        result = self.whisper_model.transcribe(
-            audio_file, word_timestamps=True, fp16=False
-        )
+                print("Loading Whisper model...")
+                self._whisper_model = whisper.load_model("base")
+        return self._whisper_model
+
+    def load_audio(self, audio_file):
+        """Decode audio to the 16 kHz mono buffer Whisper works on"""
+        return load_whisper_audio(audio_file)
+
+    def transcribe_with_timestamps(self, audio_file):
+        """
+        Step 1: Get transcript with word-level timestamps. `audio_file` may
+        also be an already-decoded 16 kHz mono float32 buffer.
+        """
+        if isinstance(audio_file, str):
+            print(f"Transcribing: {audio_file}")
+            # Decode once and keep the buffer around for the local scorer
+            audio = self.load_audio(audio_file)
+        else:
+            print(f"Transcribing {len(audio_file) / WHISPER_SAMPLE_RATE:.1f}s of audio")
+            audio = audio_file
+        model = self.whisper_model
+        with self._whisper_lock:
+            result = model.transcribe(audio, word_timestamps=True, fp16=False)
 
         # Print all segments for debugging
         print("\n--- Whisper Segments ---")
@@ -41,14 +83,20 @@ class AudioSnippetExtractor:
             )
         print("--- End of Segments ---\n")
 
-        return {"full_text": result["text"], "segments": result["segments"]}
+        return {
+            "full_text": result["text"],
+            "segments": result["segments"],
+            "audio": audio,
+        }
 
-    async def find_interesting_parts(self, transcript):
+    async def find_interesting_parts(self, transcript, candidate_ids=None):
         """Step 2: Ask LLM to identify interesting segments"""
 
         # Create segments with timestamps for the LLM
         segments_for_llm = []
         for i, segment in enumerate(transcript["segments"]):
+            if candidate_ids is not None and i not in candidate_ids:
+                continue
             segments_for_llm.append(
                 {
                     "id": i,
@@ -96,11 +144,18 @@ Return ONLY a JSON array like this. Do NOT include backticks (`):
             if not self.openrouter_client:
                 raise Exception("No OpenRouter client available")
 
-            response = await self.openrouter_client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-            )
+            with timed(
+                "highlights_llm",
+                mode=self.highlight_mode,
+                prompt_chars=len(prompt),
+                transcript_chars=len(transcript.get("full_text", "")),
+            ) as stats:
+                response = await self.openrouter_client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                )
+                stats.update(usage_fields(response))
 
             # Print the raw LLM output for debugging
             print("\n--- Raw OpenRouter LLM Output ---")
@@ -114,34 +169,60 @@ Return ONLY a JSON array like this. Do NOT include backticks (`):
 
         except Exception as e:
             print(f"Error with LLM: {e}")
-            # Fallback: return first few segments
-            fallback = []
-            for i, seg in enumerate(segments_for_llm[:3]):
-                fallback.append(
-                    {
-                        "segment_id": i,
-                        "reason": "Fallback selection",
-                        "start": seg["start"],
-                        "end": seg["end"],
-                    }
-                )
+            # Fallback: the local scorer, so every mode returns the same shape.
+            # Marked, so callers don't checkpoint a degraded result
+            fallback = select_highlights(
+                transcript["segments"], transcript.get("audio")
+            )
+            for part in fallback:
+                part["fallback"] = True
             return fallback
 
+    async def select_interesting_parts(self, transcript):
+        """Step 2: Pick highlights with the configured highlight mode"""
+        segments = transcript["segments"]
+        audio = transcript.get("audio")
+
+        if self.highlight_mode == "local":
+            print("📈 Scoring segments locally...")
+            return select_highlights(segments, audio)
+
+        if self.highlight_mode == "hybrid":
+            print("📈 Pre-filtering segments locally...")
+            candidates = select_highlights(segments, audio, k=HYBRID_CANDIDATES)
+            candidate_ids = set()
+            for window in candidates:
+                candidate_ids.update(
+                    range(window["segment_start_id"], window["segment_end_id"] + 1)
+                )
+            print("🤖 Asking LLM to find interesting parts...")
+            return await self.find_interesting_parts(transcript, candidate_ids)
+
+        print("🤖 Asking LLM to find interesting parts...")
+        return await self.find_interesting_parts(transcript)
+
     def sanitize_filename(self, text):
         # Lowercase, replace spaces with underscores, remove non-alphanumeric/underscore
         return re.sub(r"[^a-zA-Z0-9_]", "", text.replace(" ", "_")).lower()
 
     def extract_audio_snippets(
-        self, audio_file, interesting_parts, output_folder="snippets"
+        self, audio_file, interesting_parts, output_folder="snippets", transcript=None
     ):
         """Step 3: Extract the actual audio clips"""
 
+        # Snap cuts to word edges and trim dead air using the Whisper buffer
+        if transcript is not None:
+            interesting_parts = [
+                refine_boundaries(part, transcript["segments"], transcript.get("audio"))
+                for part in interesting_parts
+            ]
+
         # Create a subfolder for this audio file
         audio_base = os.path.splitext(os.path.basename(audio_file))[0]
         os.makedirs(output_folder, exist_ok=True)
 
         # Load the audio file
-        audio = AudioSegment.from_file(audio_file)
+        audio = load_audio_segment(audio_file)
 
         snippets = []
 
@@ -184,8 +265,7 @@ Return ONLY a JSON array like this. Do NOT include backticks (`):
         transcript = self.transcribe_with_timestamps(audio_file)
 
         # Step 2: Find interesting parts
-        print("🤖 Asking LLM to find interesting parts...")
-        interesting_parts = await self.find_interesting_parts(transcript)
+        interesting_parts = await self.select_interesting_parts(transcript)
 
         print(f"📝 Found {len(interesting_parts)} interesting segments:")
         for part in interesting_parts:
@@ -194,7 +274,7 @@ Return ONLY a JSON array like this. Do NOT include backticks (`):
         # Step 3: Extract audio clips
         print("✂️  Extracting audio snippets...")
         snippets = self.extract_audio_snippets(
-            audio_file, interesting_parts, output_folder
+            audio_file, interesting_parts, output_folder, transcript
         )
 
         # Save metadata
@@ -210,7 +290,9 @@ Return ONLY a JSON array like this. Do NOT include backticks (`):
         #     json.dump(metadata, f, indent=2)
         # print(f"💾 Saved metadata to: {metadata_file}")
 
-        print(f"🎉 Done! Generated {len(snippets)} snippets in '{output_folder}' folder")
+        print(
+            f"🎉 Done! Generated {len(snippets)} snippets in '{output_folder}' folder"
+        )
 
         return snippets
 
@@ -233,6 +315,8 @@ def main():
         print("⚠️  No OPENROUTER_API_KEY found. Will use fallback snippet selection.")
         openrouter_client = None
     else:
+        from openai import AsyncOpenAI
+
         openrouter_client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=router_api_key,
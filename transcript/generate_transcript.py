@@ -1,15 +1,34 @@
 import os
 import json
 from typing import List
-from pydantic import BaseModel, ValidationError
-from openai import AsyncOpenAI
-import whisper
+from pydantic import BaseModel
 import sys
 import asyncio
-from pydub import AudioSegment
 from .create_snippets import AudioSnippetExtractor
 from dotenv import load_dotenv
 from .get_directory_tree import get_directory_tree
+from .audio_formats import (
+    WHISPER_SAMPLE_RATE,
+    combined_path,
+    export_combined,
+    load_audio_segment,
+    probe_duration,
+)
+from .audio_index import AudioIndex
+from .preprocess import (
+    clip_offsets,
+    combined_sample_rate,
+    decode,
+    join_clips,
+    load_combined,
+    preprocess_settings,
+    process_clip,
+    to_segment,
+)
+from .run_manifest import RunManifest, hash_value
+from jobs.job_queue import get_queue
+from run_stats import timed, usage_fields
+from podcast.script_schema import parse_script, resolve_snippets, save_script
 
 load_dotenv()
 
@@ -22,26 +41,32 @@ ROOT_DATA_DIR = os.path.join("./data")
 # For main execution
 DOWNLOAD_FOLDER = os.getenv("DOWNLOAD_FOLDER")
 
-AUDIO_DIR = os.path.join(DOWNLOAD_FOLDER, "voice_messages")
-COMBINED_DIR = os.path.join(AUDIO_DIR, "combined")
-METADATA_DIR = os.path.join(DOWNLOAD_FOLDER, "ptg_discord_data.json")
+# Intermediate format for ScriptPaths.combined_dir: wav, pcm16k, flac or npy
+COMBINED_FORMAT = os.getenv("COMBINED_FORMAT") or "wav"
 
 # Local running
 # PROMPT_FILE = os.path.join("prompt.txt")
 # Main running
 PROMPT_FILE = os.path.join("transcript/prompt.txt")
-SNIPPETS_DIR = os.path.join(ROOT_DATA_DIR, "snippets")
-# Ensure combined directory exists
-os.makedirs(COMBINED_DIR, exist_ok=True)
+SCRIPT_MAX_TOKENS = 2000
 
 
-class ScriptSegment(BaseModel):
-    speaker: str
-    text: str
+class ScriptPaths:
+    """Where one run reads voice messages from and writes its artifacts to."""
 
-
-class GenerateResponse(BaseModel):
-    script: List[ScriptSegment]
+    def __init__(self, download_folder: str = None, data_dir: str = None):
+        self.download_folder = download_folder = download_folder or DOWNLOAD_FOLDER
+        self.data_dir = data_dir or ROOT_DATA_DIR
+        self.audio_dir = os.path.join(download_folder, "voice_messages")
+        self.combined_dir = os.path.join(self.audio_dir, "combined")
+        self.metadata_file = os.path.join(download_folder, "ptg_discord_data.json")
+        self.snippets_dir = os.path.join(self.data_dir, "snippets")
+        self.transcripts_dir = os.path.join(self.data_dir, "transcripts")
+        # Whisper output per unique audio payload, named by content hash
+        self.payload_transcripts_dir = os.path.join(self.transcripts_dir, "by_hash")
+        self.audio_index_file = os.path.join(download_folder, "audio_index.json")
+        self.run_manifest_file = os.path.join(self.data_dir, "run_manifest.json")
+        self.script_file = os.path.join(self.data_dir, "transcript.json")
 
 
 class Metadata(BaseModel):
@@ -58,109 +83,448 @@ def get_system_prompt() -> str:
         sys.exit(1)
 
 
-def transcribe_audio(audio_path: str) -> str:
-    print("transcribing", audio_path)
-    try:
-        model = whisper.load_model("base")
-        result = model.transcribe(audio_path, fp16=False)
-        return result["text"]
-    except Exception as e:
-        print(f"Whisper transcription failed for {audio_path}: {str(e)}")
-        return ""
-
-
-def get_metadata() -> List[Metadata]:
-    with open(METADATA_DIR, "r", encoding="utf-8") as f:
+def get_metadata(metadata_file: str = None) -> List[Metadata]:
+    metadata_file = metadata_file or ScriptPaths().metadata_file
+    with open(metadata_file, "r", encoding="utf-8") as f:
         metadata = json.load(f)
         return [Metadata(**data) for data in metadata]
 
 
-def concat_audio_files(audio_files: List[str], output_path: str):
-    """Concatenate multiple audio files into one and export as WAV."""
-    combined = AudioSegment.empty()
-    for file in audio_files:
-        audio = AudioSegment.from_file(file)
-        combined += audio
-    combined.export(output_path, format="wav")
+def _file_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _read_sidecar(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def concat_audio_files(audio_files: List[str], output_path: str, format: str = "wav"):
+    """
+    Concatenate multiple audio files into one and export it in one of the
+    combined formats (see audio_formats.COMBINED_FORMATS).
+
+    A sidecar manifest next to the output records the inputs it was built
+    from, so unchanged inputs skip the work entirely and a list that only
+    grew at the end decodes just the new files.
+    """
+    from pydub import AudioSegment
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    sidecar_path = f"{output_path}.json"
+    inputs = [_file_signature(f) for f in audio_files]
+    previous = _read_sidecar(sidecar_path)
+
+    settings = preprocess_settings()
+    reusable = (
+        previous is not None
+        and previous.get("format") == format
+        and previous.get("preprocess") == settings
+        and os.path.exists(output_path)
+    )
+    if reusable and previous["inputs"] == inputs:
+        print(f"⏭️  {output_path} is up to date")
+        return
+
+    appending = reusable and inputs[: len(previous["inputs"])] == previous["inputs"]
+    new_files = audio_files[len(previous["inputs"]) :] if appending else audio_files
+    if appending:
+        print(f"➕ Appending {len(new_files)} new file(s) to {output_path}")
+
+    if settings is not None:
+        # Decode, resample and level each file straight into NumPy buffers
+        sample_rate = combined_sample_rate(format)
+        clips = [process_clip(decode(f, sample_rate), sample_rate) for f in new_files]
+        if appending:
+            clips.insert(0, load_combined(output_path, sample_rate))
+        combined = to_segment(join_clips(clips, sample_rate), sample_rate)
+    else:
+        combined = (
+            load_audio_segment(output_path) if appending else AudioSegment.empty()
+        )
+        for file in new_files:
+            audio = AudioSegment.from_file(file)
+            combined += audio
+
+    # Drop the sidecar first so a crash mid-export forces a full rebuild
+    if previous is not None:
+        os.remove(sidecar_path)
+    export_combined(combined, output_path, format)
+
+    with open(sidecar_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"format": format, "preprocess": settings, "inputs": inputs}, f, indent=2
+        )
+
+
+def save_transcript(transcript: dict, path: str):
+    """Persist a Whisper transcript without the decoded audio buffer."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {k: v for k, v in transcript.items() if k != "audio"}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def load_transcript(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stitch_transcripts(parts: List[dict]) -> dict:
+    """Join per-file transcripts into one timed like the combined audio."""
+    offsets = clip_offsets([part["duration"] for part in parts])
+    segments = []
+    for part, offset in zip(parts, offsets):
+        for segment in part["segments"]:
+            segment = dict(segment, id=len(segments))
+            segment["start"] += offset
+            segment["end"] += offset
+            if "words" in segment:
+                segment["words"] = [
+                    dict(w, start=w["start"] + offset, end=w["end"] + offset)
+                    for w in segment["words"]
+                ]
+            segments.append(segment)
+    return {
+        "full_text": " ".join(part["full_text"].strip() for part in parts),
+        "segments": segments,
+    }
+
+
+# How far the stitched timeline may drift from the combined file per clip
+# (resampling rounds each clip's length to the combined rate)
+STITCH_TOLERANCE_SECONDS = 0.01
+
+
+def payload_transcript_file(paths: ScriptPaths, digest: str) -> str:
+    """Cached Whisper output for one audio payload under the current settings."""
+    settings = preprocess_settings()
+    if settings is None:
+        return os.path.join(paths.payload_transcripts_dir, f"{digest}.json")
+    key = hash_value(digest, settings)[:16]
+    return os.path.join(paths.payload_transcripts_dir, f"{digest}_{key}.json")
+
+
+def whisper_input(path: str):
+    """
+    What Whisper hears for one file: the same DC removal, gate and leveling
+    concat_audio_files applies, at Whisper's rate, or the file as is when
+    preprocessing is off.
+    """
+    if preprocess_settings() is None:
+        return path
+    return process_clip(decode(path, WHISPER_SAMPLE_RATE), WHISPER_SAMPLE_RATE)
+
+
+async def transcribe_inputs(
+    extractor: AudioSnippetExtractor,
+    inputs: List[tuple],
+    paths: ScriptPaths,
+    combined_file: str,
+) -> dict:
+    """
+    Whisper each unique audio payload once, ever: per-file transcripts are
+    cached under their content hash and reused by every speaker and run
+    that references the same audio, then stitched for this speaker.
+
+    Stitching shifts each part by where its clip starts in the combined
+    file (clip_offsets mirrors join_clips' crossfades). If that timeline
+    doesn't end where the combined file does, the combined file itself is
+    transcribed instead, so snippet cuts never land on shifted timestamps.
+    """
+    parts = []
+    for path, digest in inputs:
+        cache_file = payload_transcript_file(paths, digest)
+        if os.path.exists(cache_file):
+            print(f"⏭️  Reusing transcript of {os.path.basename(path)}")
+            parts.append(load_transcript(cache_file))
+            continue
+
+        with timed("whisper", file=os.path.basename(path)) as stats:
+            audio = await asyncio.to_thread(whisper_input, path)
+            part = await asyncio.to_thread(extractor.transcribe_with_timestamps, audio)
+            part["duration"] = len(part.pop("audio")) / WHISPER_SAMPLE_RATE
+            stats["audio_seconds"] = round(part["duration"], 2)
+            stats["chars"] = len(part["full_text"])
+        save_transcript(part, cache_file)
+        parts.append(part)
+
+    transcript = stitch_transcripts(parts)
+    durations = [part["duration"] for part in parts]
+    stitched_end = clip_offsets(durations)[-1] + durations[-1] if parts else 0.0
+    combined_end = await asyncio.to_thread(probe_duration, combined_file)
+    if combined_end is not None and abs(
+        stitched_end - combined_end
+    ) > STITCH_TOLERANCE_SECONDS * len(parts):
+        print(
+            f"⚠️  Stitched transcript ends at {stitched_end:.2f}s but "
+            f"{combined_file} is {combined_end:.2f}s, transcribing it whole"
+        )
+        with timed("whisper", file=os.path.basename(combined_file)) as stats:
+            transcript = await asyncio.to_thread(
+                extractor.transcribe_with_timestamps, combined_file
+            )
+            transcript.pop("audio")
+            stats["audio_seconds"] = round(combined_end, 2)
+            stats["chars"] = len(transcript["full_text"])
+    return transcript
+
+
+def speaker_inputs(
+    person: Metadata, paths: ScriptPaths, quiet: bool = False, save: bool = True
+) -> List[tuple]:
+    """
+    (path, sha256) of each of the speaker's audio files, dropping files
+    whose content was already listed (e.g. a reposted voice note). With
+    save=False new hashes aren't written back to the audio index.
+    """
+    index = AudioIndex(paths.audio_index_file)
+    inputs, seen = [], set()
+    for filename in person.audio_files:
+        path = os.path.join(paths.audio_dir, filename)
+        digest = index.hash(path)
+        if digest in seen:
+            if not quiet:
+                print(f"⏭️  {person.name}: {filename} repeats earlier audio, skipping")
+            continue
+        seen.add(digest)
+        inputs.append((path, digest))
+    if save:
+        index.save()
+    return inputs
+
+
+def stage_hashes(
+    person: Metadata, highlight_mode: str, paths: ScriptPaths, inputs=None
+) -> dict:
+    """
+    The run manifest input hash of each per-speaker sub-stage. Each one
+    chains the previous, so changing an input invalidates everything after.
+    Only audio content goes into them, not file or speaker names, so
+    speakers with the same audio share transcript and highlights results.
+    """
+    inputs = inputs if inputs is not None else speaker_inputs(person, paths)
+    concat = hash_value(
+        COMBINED_FORMAT, preprocess_settings(), [digest for _, digest in inputs]
+    )
+    transcript = hash_value(concat, "whisper-base", "preprocessed-payloads")
+    highlights = hash_value(transcript, highlight_mode)
+    snippets = hash_value(highlights, paths.snippets_dir)
+    return {
+        "concat": concat,
+        "transcript": transcript,
+        "highlights": highlights,
+        "snippets": snippets,
+    }
+
+
+async def process_speaker(
+    person: Metadata,
+    extractor: AudioSnippetExtractor,
+    manifest: RunManifest,
+    paths: ScriptPaths = None,
+) -> str:
+    """
+    Run concat -> transcript -> highlights -> snippets for one speaker,
+    skipping every sub-stage the manifest says already ran on the same
+    inputs. Returns the speaker's full transcript text.
+
+    CPU-bound steps run in a worker thread, so several speakers (or
+    tenants) can share one event loop.
+    """
+    paths = paths or ScriptPaths()
+    name = person.name.lower()
+    combined_file = combined_path(paths.combined_dir, name, COMBINED_FORMAT)
+    transcript_file = os.path.join(paths.transcripts_dir, f"{name}.json")
+
+    inputs = await asyncio.to_thread(speaker_inputs, person, paths)
+    input_files = [path for path, _ in inputs]
+    hashes = stage_hashes(person, extractor.highlight_mode, paths, inputs)
+    concat_hash = hashes["concat"]
+
+    # Concat (skips itself via its sidecar when the inputs are unchanged)
+    await asyncio.to_thread(
+        concat_audio_files, input_files, combined_file, COMBINED_FORMAT
+    )
+    if manifest.get(person.name, "concat", concat_hash) is None:
+        manifest.complete(person.name, "concat", concat_hash, combined_file)
+
+    # Transcript
+    transcript_hash = hashes["transcript"]
+    if manifest.get(person.name, "transcript", transcript_hash) and os.path.exists(
+        transcript_file
+    ):
+        print(f"⏭️  {person.name}: reusing transcript")
+        transcript = load_transcript(transcript_file)
+    else:
+        transcript = await transcribe_inputs(extractor, inputs, paths, combined_file)
+        save_transcript(transcript, transcript_file)
+        manifest.complete(person.name, "transcript", transcript_hash, transcript_file)
+
+    # Highlights
+    degraded = False
+    highlights_hash = hashes["highlights"]
+    interesting_parts = manifest.get(person.name, "highlights", highlights_hash)
+    if interesting_parts is None:
+        # Another speaker with exactly this audio already has them
+        interesting_parts = manifest.find("highlights", highlights_hash)
+        if interesting_parts is not None:
+            manifest.complete(
+                person.name, "highlights", highlights_hash, interesting_parts
+            )
+    if interesting_parts is None:
+        if "audio" not in transcript:
+            transcript["audio"] = await asyncio.to_thread(
+                extractor.load_audio, combined_file
+            )
+        interesting_parts = await extractor.select_interesting_parts(transcript)
+        degraded = any(part.get("fallback") for part in interesting_parts)
+        if degraded:
+            # Use them for this run, but ask the LLM again next time
+            print(f"⚠️  {person.name}: using fallback highlights, not checkpointing")
+        else:
+            manifest.complete(
+                person.name, "highlights", highlights_hash, interesting_parts
+            )
+    else:
+        print(f"⏭️  {person.name}: reusing highlights")
+
+    # Snippets
+    snippets_hash = hashes["snippets"]
+    snippets = manifest.get(person.name, "snippets", snippets_hash)
+    if snippets is None or not all(os.path.exists(s["filepath"]) for s in snippets):
+        if "audio" not in transcript:
+            transcript["audio"] = await asyncio.to_thread(
+                extractor.load_audio, combined_file
+            )
+        snippets = await asyncio.to_thread(
+            extractor.extract_audio_snippets,
+            combined_file,
+            interesting_parts,
+            paths.snippets_dir,
+            transcript,
+        )
+        if not degraded:
+            manifest.complete(person.name, "snippets", snippets_hash, snippets)
+    else:
+        print(f"⏭️  {person.name}: reusing {len(snippets)} snippets")
+
+    return transcript["full_text"]
 
 
-async def generate_script():
+def _get_router_api_key() -> str:
     router_api_key = os.getenv("OPENROUTER_API_KEY")
     if not router_api_key:
         print("OPENROUTER_API_KEY not set in environment.")
         sys.exit(1)
-    model = os.getenv("OPENROUTER_MODEL")
-    # Process the audio file
-    extractor = AudioSnippetExtractor(router_api_key)
+    return router_api_key
 
-    metadata = get_metadata()
-    for person in metadata:
-        # Concatenate audio files for this person
-        input_files = [os.path.join(AUDIO_DIR, f) for f in person.audio_files]
-        output_file = os.path.join(COMBINED_DIR, f"{person.name.lower()}.wav")
-        concat_audio_files(input_files, output_file)
-        person.audio_files = [f"{person.name.lower()}_combined.wav"]
-
-    if not os.path.isdir(AUDIO_DIR):
-        print(f"Audio directory not found: {AUDIO_DIR}")
+
+async def transcribe_speakers(
+    extractor: AudioSnippetExtractor = None, paths: ScriptPaths = None
+) -> dict:
+    """Run every speaker's per-speaker stages and return their transcripts."""
+    paths = paths or ScriptPaths()
+    # Process the audio file (a long-lived caller can pass a warm extractor)
+    extractor = extractor or AudioSnippetExtractor(_get_router_api_key())
+
+    if not os.path.isdir(paths.audio_dir):
+        print(f"Audio directory not found: {paths.audio_dir}")
         sys.exit(1)
 
-    audio_files = [
-        f
-        for f in os.listdir(COMBINED_DIR)
-        if os.path.isfile(os.path.join(COMBINED_DIR, f))
-    ]
-    if not audio_files:
-        print(f"No audio files found in {COMBINED_DIR}")
+    metadata = get_metadata(paths.metadata_file)
+    if not metadata:
+        print(f"No speakers found in {paths.metadata_file}")
         sys.exit(1)
 
+    # With JOB_QUEUE set, speakers become jobs any worker process can take
+    queue = get_queue()
+    if queue is not None:
+        from jobs.handlers import run_speaker_jobs
+
+        texts = await run_speaker_jobs(queue, metadata, paths, extractor)
+        return {transcript_key(p): text for p, text in zip(metadata, texts)}
+
+    # Completed sub-stages survive a failed run, so a re-run resumes here
+    manifest = RunManifest(paths.run_manifest_file)
     transcripts = {}
-    for audio_file in audio_files:
-        audio_path = os.path.join(COMBINED_DIR, audio_file)
-        await extractor.process_audio_file(audio_path, SNIPPETS_DIR)
+    for person in metadata:
+        transcripts[transcript_key(person)] = await process_speaker(
+            person, extractor, manifest, paths
+        )
+    return transcripts
 
-        transcript = transcribe_audio(audio_path)
-        transcripts[audio_file] = transcript
 
-    snippets_tree = get_directory_tree(SNIPPETS_DIR, "data")
+def transcript_key(person: Metadata) -> str:
+    """Name a speaker's transcript after their combined audio file."""
+    return os.path.basename(combined_path("", person.name.lower(), COMBINED_FORMAT))
 
-    system_prompt = get_system_prompt()
-    client = AsyncOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=router_api_key,
+
+async def write_script(
+    transcripts: dict, extractor: AudioSnippetExtractor, paths: ScriptPaths = None
+):
+    """Ask the LLM for the podcast script and save it as transcript.json."""
+    paths = paths or ScriptPaths()
+    model = os.getenv("OPENROUTER_MODEL")
+    snippets_tree = get_directory_tree(
+        paths.snippets_dir, os.path.normpath(paths.data_dir)
     )
+
+    system_prompt = get_system_prompt()
+    # Reuse the extractor's OpenRouter client and its connection pool
+    client = extractor.openrouter_client
     user_prompt = json.dumps(
         {"transcripts": transcripts, "snippets_tree": snippets_tree}
     )
 
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=2000,
-        )
+        prompt_chars = len(system_prompt) + len(user_prompt)
+        with timed("script_llm", prompt_chars=prompt_chars) as stats:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=0.7,
+                max_tokens=SCRIPT_MAX_TOKENS,
+            )
+            stats.update(usage_fields(response))
         content = response.choices[0].message.content.strip()
-        script_json = json.loads(content)
+        # Same schema the renderer loads with, so a bad script never reaches TTS
+        segments = parse_script(content)
+        resolve_snippets(segments, paths.data_dir)
+        save_script(segments, paths.script_file)
 
-        with open(
-            os.path.join(ROOT_DATA_DIR, "transcript.json"), "w", encoding="utf-8"
-        ) as f:
-            json.dump(script_json, f, indent=2, ensure_ascii=False)
-
-    except (json.JSONDecodeError, ValidationError) as e:
+    except ValueError as e:
         print(
-            f"Failed to parse model output as valid JSON: {str(e)}\nRaw output: {content}"
+            f"Model output is not a valid podcast script: {str(e)}\nRaw output: {content}"
         )
         sys.exit(1)
+    except FileNotFoundError as e:
+        print(f"Model referenced snippets that do not exist: {str(e)}")
+        sys.exit(1)
     except Exception as e:
         print(f"OpenRouter API error: {str(e)}")
         sys.exit(1)
 
 
+async def generate_script(
+    extractor: AudioSnippetExtractor = None, paths: ScriptPaths = None
+):
+    extractor = extractor or AudioSnippetExtractor(_get_router_api_key())
+    transcripts = await transcribe_speakers(extractor, paths)
+    await write_script(transcripts, extractor, paths)
+
+
+def transcribe_speakers_sync():
+    return asyncio.run(transcribe_speakers())
+
+
 def generate_script_sync():
     asyncio.run(generate_script())
 
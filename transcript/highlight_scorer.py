@@ -0,0 +1,213 @@
+"""
+Local Highlight Scorer
+Scores Whisper segments with cheap per-segment features and picks the
+top-k non-overlapping clip windows without calling an LLM.
+"""
+
+import re
+import numpy as np
+from .audio_formats import WHISPER_SAMPLE_RATE
+
+FRAME_MS = 20
+MAX_CLIP_SECONDS = 30.0
+
+# Words that tend to show up around funny moments or big life updates
+KEYWORDS = {
+    "funny": [
+        "haha",
+        "lol",
+        "laugh",
+        "hilarious",
+        "crazy",
+        "insane",
+        "ridiculous",
+        "oh my god",
+        "no way",
+        "dude",
+        "literally",
+        "disaster",
+        "embarrassing",
+    ],
+    "update": [
+        "finally",
+        "engaged",
+        "married",
+        "new job",
+        "got the job",
+        "promoted",
+        "moved",
+        "moving",
+        "broke up",
+        "dating",
+        "graduated",
+        "accepted",
+        "quit",
+        "trip",
+        "announce",
+    ],
+}
+
+FEATURE_WEIGHTS = {
+    "confidence": 0.5,
+    "speech": 1.0,
+    "rate": 0.6,
+    "loudness": 0.8,
+    "burstiness": 0.7,
+    "keywords": 1.2,
+}
+
+
+def _keyword_pattern(words):
+    return re.compile(
+        r"\b(" + "|".join(re.escape(w) for w in words) + r")\b", re.IGNORECASE
+    )
+
+
+_KEYWORD_PATTERNS = {
+    label: _keyword_pattern(words) for label, words in KEYWORDS.items()
+}
+
+
+def _zscore(values):
+    std = values.std()
+    if std < 1e-9:
+        return np.zeros_like(values)
+    return (values - values.mean()) / std
+
+
+def frame_rms(audio, sample_rate=WHISPER_SAMPLE_RATE, frame_ms=FRAME_MS):
+    """RMS energy of fixed-size frames over a mono float buffer."""
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(1, dtype=np.float32)
+    frames = np.asarray(audio[: n_frames * frame_len], dtype=np.float32)
+    frames = frames.reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames**2, axis=1))
+
+
+def _audio_features(segments, audio, sample_rate):
+    """Mean loudness (dB) and energy burstiness per segment from the buffer."""
+    n = len(segments)
+    if audio is None or len(audio) == 0:
+        return np.zeros(n), np.zeros(n)
+
+    rms = frame_rms(audio, sample_rate)
+    db = 20 * np.log10(rms + 1e-6)
+    frames_per_second = 1000 / FRAME_MS
+
+    starts = np.array([s["start"] for s in segments]) * frames_per_second
+    ends = np.array([s["end"] for s in segments]) * frames_per_second
+    lo = np.clip(starts.astype(int), 0, len(db) - 1)
+    hi = np.clip(np.maximum(ends.astype(int), lo + 1), 1, len(db))
+
+    # Prefix sums give every segment's mean and variance in one shot
+    csum = np.concatenate(([0.0], np.cumsum(db)))
+    csum_sq = np.concatenate(([0.0], np.cumsum(db**2)))
+    count = hi - lo
+    mean = (csum[hi] - csum[lo]) / count
+    var = np.maximum((csum_sq[hi] - csum_sq[lo]) / count - mean**2, 0.0)
+
+    # Laughter shows up as bursty energy, so use the spread of frame loudness
+    return mean, np.sqrt(var)
+
+
+def score_segments(segments, audio=None, sample_rate=WHISPER_SAMPLE_RATE):
+    """Return one interest score per Whisper segment (higher is better)."""
+    if not segments:
+        return np.zeros(0)
+
+    avg_logprob = np.array([s.get("avg_logprob", 0.0) for s in segments])
+    no_speech = np.array([s.get("no_speech_prob", 0.0) for s in segments])
+    durations = np.array([max(s["end"] - s["start"], 1e-3) for s in segments])
+    word_counts = np.array(
+        [len(s.get("words") or s["text"].split()) for s in segments], dtype=float
+    )
+    keyword_hits = np.array(
+        [
+            sum(len(p.findall(s["text"])) for p in _KEYWORD_PATTERNS.values())
+            for s in segments
+        ],
+        dtype=float,
+    )
+    loudness, burstiness = _audio_features(segments, audio, sample_rate)
+
+    features = {
+        "confidence": _zscore(avg_logprob),
+        "speech": -_zscore(no_speech),
+        "rate": _zscore(word_counts / durations),
+        "loudness": _zscore(loudness),
+        "burstiness": _zscore(burstiness),
+        "keywords": np.minimum(keyword_hits, 3),
+    }
+    score = sum(FEATURE_WEIGHTS[name] * values for name, values in features.items())
+
+    # Mostly-silent segments should never win on loudness alone
+    return np.where(no_speech > 0.8, score - 5.0, score)
+
+
+def _describe(segments, start_id, end_id, max_words=6):
+    text = " ".join(s["text"].strip() for s in segments[start_id : end_id + 1])
+    words = text.split()[:max_words]
+    labels = [
+        label
+        for label, pattern in _KEYWORD_PATTERNS.items()
+        if pattern.search(text) is not None
+    ]
+    prefix = "Big update" if "update" in labels else "Funny moment"
+    return f"{prefix} {' '.join(words)}".strip()
+
+
+def candidate_windows(segments, scores, max_duration=MAX_CLIP_SECONDS):
+    """Best-scoring contiguous segment window starting at each segment."""
+    if not segments:
+        return []
+
+    starts = np.array([s["start"] for s in segments])
+    ends = np.array([s["end"] for s in segments])
+    prefix = np.concatenate(([0.0], np.cumsum(scores)))
+    last_valid = np.searchsorted(ends, starts + max_duration, side="right") - 1
+
+    windows = []
+    for i in range(len(segments)):
+        j_max = max(i, int(last_valid[i]))
+        # prefix[j + 1] - prefix[i] is the window sum for every end j
+        j = i + int(np.argmax(prefix[i + 1 : j_max + 2]))
+        windows.append(
+            {
+                "segment_start_id": i,
+                "segment_end_id": j,
+                "start": float(starts[i]),
+                "end": float(min(ends[j], starts[i] + max_duration)),
+                "score": float(prefix[j + 1] - prefix[i]),
+            }
+        )
+    return windows
+
+
+def select_highlights(
+    segments, audio=None, k=2, max_duration=MAX_CLIP_SECONDS, sample_rate=None
+):
+    """
+    Pick the top-k non-overlapping windows, in the same shape the LLM
+    returns from find_interesting_parts.
+    """
+    scores = score_segments(segments, audio, sample_rate or WHISPER_SAMPLE_RATE)
+    windows = candidate_windows(segments, scores, max_duration)
+
+    chosen = []
+    for window in sorted(windows, key=lambda w: w["score"], reverse=True):
+        if len(chosen) >= k:
+            break
+        overlaps = any(
+            window["start"] < c["end"] and c["start"] < window["end"] for c in chosen
+        )
+        if not overlaps:
+            chosen.append(window)
+
+    chosen.sort(key=lambda w: w["start"])
+    for window in chosen:
+        window["reason"] = _describe(
+            segments, window["segment_start_id"], window["segment_end_id"]
+        )
+    return chosen
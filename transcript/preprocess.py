@@ -0,0 +1,168 @@
+"""
+Voice Message Preprocessing
+Decodes each voice message straight to mono float32 at the combined rate
+(ffmpeg resamples and downmixes while decoding), then cleans it up with
+whole-array NumPy operations: DC removal, a noise gate, per-clip loudness
+leveling and short equal-power crossfades where clips are joined.
+"""
+
+import os
+import subprocess
+from typing import List, Optional
+import numpy as np
+
+from .audio_formats import WHISPER_SAMPLE_RATE
+
+PREPROCESS_AUDIO = os.getenv("PREPROCESS_AUDIO", "1") != "0"
+
+FULL_SAMPLE_RATE = 48000  # Discord voice messages are 48 kHz Opus
+FRAME_MS = 20
+TARGET_DBFS = -20.0  # RMS of the voiced frames after leveling
+MAX_GAIN_DB = 24.0
+GATE_OPEN_DB = 8.0  # frames this far above the clip's noise floor are voice
+GATE_FLOOR_DB = -60.0  # frames below this are never voice
+GATE_ATTENUATION_DB = -18.0
+GATE_SMOOTH_FRAMES = 3
+PEAK_CEILING = 0.98
+CROSSFADE_MS = 30
+
+
+def preprocess_settings() -> Optional[dict]:
+    """Everything that changes the output, for sidecars and stage hashes."""
+    if not PREPROCESS_AUDIO:
+        return None
+    return {
+        "full_sample_rate": FULL_SAMPLE_RATE,
+        "frame_ms": FRAME_MS,
+        "target_dbfs": TARGET_DBFS,
+        "max_gain_db": MAX_GAIN_DB,
+        "gate_open_db": GATE_OPEN_DB,
+        "gate_floor_db": GATE_FLOOR_DB,
+        "gate_attenuation_db": GATE_ATTENUATION_DB,
+        "gate_smooth_frames": GATE_SMOOTH_FRAMES,
+        "crossfade_ms": CROSSFADE_MS,
+    }
+
+
+def combined_sample_rate(format: str) -> int:
+    # The 16 kHz formats only feed Whisper, so decode straight to its rate
+    return WHISPER_SAMPLE_RATE if format in ("pcm16k", "npy") else FULL_SAMPLE_RATE
+
+
+def decode(path: str, sample_rate: int) -> np.ndarray:
+    """Decode any file ffmpeg reads to mono float32 at `sample_rate`."""
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        path,
+        "-f",
+        "f32le",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "pipe:1",
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed decoding {path}: "
+            f"{result.stderr.decode(errors='replace').strip()}"
+        )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _frame_db(samples: np.ndarray, frame: int) -> np.ndarray:
+    count = len(samples) // frame
+    frames = samples[: count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def process_clip(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """DC removal, noise gate and loudness leveling for one voice message."""
+    samples = samples - np.float32(samples.mean()) if len(samples) else samples
+    frame = sample_rate * FRAME_MS // 1000
+    if len(samples) < frame:
+        return samples.astype(np.float32, copy=False)
+
+    frame_db = _frame_db(samples, frame)
+
+    # Gate: voice is whatever clears the clip's own noise floor
+    threshold = max(np.percentile(frame_db, 10) + GATE_OPEN_DB, GATE_FLOOR_DB)
+    voiced = frame_db > threshold
+    if not voiced.any():
+        voiced[:] = True
+    frame_gain = np.where(voiced, 1.0, 10 ** (GATE_ATTENUATION_DB / 20))
+    kernel = np.ones(GATE_SMOOTH_FRAMES) / GATE_SMOOTH_FRAMES
+    frame_gain = np.convolve(frame_gain, kernel, mode="same")
+
+    # Leveling: bring the voiced frames' RMS to the target (a gated loudness)
+    voiced_db = 10 * np.log10(np.mean(10 ** (frame_db[voiced] / 10)))
+    gain_db = np.clip(TARGET_DBFS - voiced_db, -MAX_GAIN_DB, MAX_GAIN_DB)
+    frame_gain *= 10 ** (gain_db / 20)
+
+    # Interpolate frame gains to samples so gate transitions are ramps
+    centers = (np.arange(len(frame_gain)) + 0.5) * frame
+    gain = np.interp(
+        np.arange(len(samples), dtype=np.float32), centers, frame_gain
+    ).astype(np.float32)
+    out = samples * gain
+
+    peak = np.abs(out).max()
+    if peak > PEAK_CEILING:
+        out *= np.float32(PEAK_CEILING / peak)
+    return out
+
+
+def join_clips(clips: List[np.ndarray], sample_rate: int) -> np.ndarray:
+    """Concatenate clips into one buffer with equal-power crossfades."""
+    fade = sample_rate * CROSSFADE_MS // 1000
+    overlaps = [min(fade, len(a), len(b)) for a, b in zip(clips, clips[1:])]
+    out = np.empty(sum(len(c) for c in clips) - sum(overlaps), dtype=np.float32)
+
+    position = 0
+    for i, clip in enumerate(clips):
+        overlap = overlaps[i - 1] if i else 0
+        if overlap:
+            t = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+            head = out[position - overlap : position]
+            head *= np.cos(t * np.pi / 2)
+            head += clip[:overlap] * np.sin(t * np.pi / 2)
+        rest = clip[overlap:]
+        out[position : position + len(rest)] = rest
+        position += len(rest)
+    return out
+
+
+def load_combined(path: str, sample_rate: int) -> np.ndarray:
+    """Read an existing combined file back as float32 (for appending)."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return decode(path, sample_rate)
+
+
+def to_segment(samples: np.ndarray, sample_rate: int):
+    """Wrap float32 samples as a 16-bit AudioSegment for export."""
+    from pydub import AudioSegment
+
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    return AudioSegment(
+        pcm.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1
+    )
+
+
+def clip_offsets(durations: List[float]) -> List[float]:
+    """Where each clip starts (seconds) once clips of these lengths are joined."""
+    overlap = CROSSFADE_MS / 1000 if PREPROCESS_AUDIO else 0.0
+    offsets, position = [], 0.0
+    for i, duration in enumerate(durations):
+        if i:
+            position -= min(overlap, duration, durations[i - 1])
+        offsets.append(position)
+        position += duration
+    return offsets
@@ -0,0 +1,97 @@
+import os
+import json
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """sha256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_value(*parts) -> str:
+    """sha256 of any JSON-serializable values, used to chain stage hashes."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunManifest:
+    """
+    Durable record of which per-speaker sub-stages of generate_script have
+    finished, keyed by the hash of each stage's inputs.
+
+    Each stage's input hash should include the previous stage's hash, so
+    changing an early input invalidates everything after it and a re-run
+    resumes from the first incomplete step.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Ignoring unreadable run manifest {self.path}: {e}")
+        return {"speakers": {}}
+
+    @contextmanager
+    def _locked(self):
+        # Worker processes sharing a data dir update the same manifest
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, speaker: str, stage: str, input_hash: str):
+        """Return the stored result if `stage` already ran on these inputs."""
+        entry = self.data["speakers"].get(speaker, {}).get(stage)
+        if entry and entry["input_hash"] == input_hash:
+            return entry["result"]
+        return None
+
+    def find(self, stage: str, input_hash: str):
+        """Like get, but from any speaker that ran `stage` on these inputs."""
+        for stages in self.data["speakers"].values():
+            entry = stages.get(stage)
+            if entry and entry["input_hash"] == input_hash:
+                return entry["result"]
+        return None
+
+    def complete(self, speaker: str, stage: str, input_hash: str, result):
+        """Record a finished stage and persist the manifest immediately."""
+        entry = {
+            "input_hash": input_hash,
+            "result": result,
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._locked():
+            # Merge with what other processes wrote since we loaded
+            self.data = self._load()
+            self.data["speakers"].setdefault(speaker, {})[stage] = entry
+            self._write()
+
+    def save(self):
+        with self._locked():
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        # Atomic swap so a crash mid-write never leaves a truncated manifest
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,70 @@
+"""
+Snippet Boundary Refiner
+Snaps clip cuts to Whisper word edges and trims dead air using an RMS
+scan of the already decoded audio buffer.
+"""
+
+import numpy as np
+from .audio_formats import WHISPER_SAMPLE_RATE
+from .highlight_scorer import FRAME_MS, MAX_CLIP_SECONDS, frame_rms
+
+SILENCE_DB = -40.0  # frames this far below the clip's peak count as silence
+EDGE_PAD = 0.08  # seconds kept around the first/last voiced frame
+
+
+def _words_in_range(segments, start, end):
+    words = []
+    for segment in segments:
+        if segment["end"] < start or segment["start"] > end:
+            continue
+        for word in segment.get("words") or []:
+            if word["end"] > start and word["start"] < end:
+                words.append(word)
+    return words
+
+
+def _trim_silence(audio, sample_rate, start, end):
+    """Move start/end inwards to the first/last voiced frame."""
+    lo = int(start * sample_rate)
+    hi = int(end * sample_rate)
+    rms = frame_rms(audio[lo:hi], sample_rate)
+    db = 20 * np.log10(rms + 1e-6)
+    voiced = np.flatnonzero(db > db.max() + SILENCE_DB)
+    if voiced.size == 0:
+        return start, end
+
+    frame_seconds = FRAME_MS / 1000
+    new_start = start + voiced[0] * frame_seconds - EDGE_PAD
+    new_end = start + (voiced[-1] + 1) * frame_seconds + EDGE_PAD
+    return max(start, new_start), min(end, new_end)
+
+
+def refine_boundaries(
+    part,
+    segments,
+    audio=None,
+    sample_rate=WHISPER_SAMPLE_RATE,
+    max_duration=MAX_CLIP_SECONDS,
+):
+    """Return a copy of `part` with start/end snapped to word edges."""
+    start, end = float(part["start"]), float(part["end"])
+    words = _words_in_range(segments, start, end)
+
+    if words:
+        # Widen to whole words so a cut never lands mid-word
+        start, end = words[0]["start"], words[-1]["end"]
+
+    if audio is not None and len(audio) > 0 and end > start:
+        # Only sub-threshold frames are dropped, so voiced audio stays intact
+        start, end = _trim_silence(audio, sample_rate, start, end)
+        words = [w for w in words if w["end"] > start and w["start"] < end]
+
+    if end - start > max_duration:
+        # Drop whole trailing words until the clip fits, else hard cut
+        fitting = [w for w in words if w["end"] - start <= max_duration]
+        end = fitting[-1]["end"] if fitting else start + max_duration
+
+    refined = dict(part)
+    refined["start"] = round(float(start), 3)
+    refined["end"] = round(float(end), 3)
+    return refined